@@ -0,0 +1,3 @@
+from dewar.cli import main
+
+main()
@@ -1,9 +1,9 @@
 import inspect
-import copy
+import contextvars
+from collections import ChainMap, namedtuple
+from contextlib import contextmanager
 from pathlib import Path
 
-from collections import namedtuple
-
 
 def get_caller_location(frames=2):
     stack = inspect.stack()
@@ -18,18 +18,40 @@ def get_caller_location(frames=2):
 
 InfoTuple = namedtuple('InfoTuple', 'function_name variables')
 
+# The page function currently being evaluated. Set by the wrapper that
+# Site.register creates, so that looking up the current page and site
+# doesn't need to walk the stack. Context variables are local to each
+# thread and each asyncio task, so concurrent renders don't interfere.
+_current_page = contextvars.ContextVar('dewar_current_page', default=None)
+
+
+@contextmanager
+def page_context(func):
+    """A context manager that makes func the current page function
+    (and its site the current site) while it is active.
+
+    :param func: A page function registered to a site.
+    """
+    token = _current_page.set(func)
+    try:
+        yield func
+    finally:
+        _current_page.reset(token)
+
+
+def get_current_page():
+    """Return the page function currently being evaluated, or None."""
+    return _current_page.get()
+
 
 def _frame_info_iterator():
     init_frame = inspect.currentframe()
     frame = init_frame.f_back
     while frame:
-        frame_vars = copy.copy(frame.f_globals)
-        frame_vars.update(frame.f_locals)
-        try:
-            yield InfoTuple(inspect.getframeinfo(frame).function, frame_vars)
-        except IndexError:
-            # means there's no code context (i.e., you're inside jinja)
-            pass
+        # ChainMap looks names up in locals, then globals, without
+        # copying either of them.
+        frame_vars = ChainMap(frame.f_locals, frame.f_globals)
+        yield InfoTuple(frame.f_code.co_name, frame_vars)
         frame = frame.f_back
 
 
@@ -42,16 +64,24 @@ def _hasattr_static(obj, name):
 
 
 def get_closest_path():
-    frame = inspect.currentframe()
+    func = _current_page.get()
+    if func is not None:
+        return func.path
+
+    # fall back to searching the stack, for page functions that are
+    # being evaluated some other way.
     for frame in _frame_info_iterator():
         func = frame.variables.get(frame.function_name)
-        if hasattr(func, '_registered_to'):
+        if _hasattr_static(func, '_registered_to'):
             return func.path
     raise RuntimeError("There is no current dewar page being loaded")
 
 
 def get_closest_site():
-    frame = inspect.currentframe()
+    func = _current_page.get()
+    if func is not None:
+        return func._registered_to
+
     for frame in _frame_info_iterator():
         func = frame.variables.get(frame.function_name)
         # static prevents site recursing on itself when accessed
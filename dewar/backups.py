@@ -0,0 +1,99 @@
+"""Backups of a rendered site, made before it is rendered again.
+
+Backups are kept in an `old/` directory next to the rendered site, as
+`site_<time>.zip` archives, or as `site_<time>/` directories of
+hardlinks to the rendered files (which take almost no time or space).
+"""
+from pathlib import Path
+
+import shutil
+import time
+
+from dewar.files import link_tree, tree_size
+
+BACKUP_METHODS = ('zip', 'hardlink')
+
+
+def backups_path(path):
+    """Return the directory backups of a site rendered to path are kept in.
+
+    :param path: the path the site is rendered to.
+    :type path: pathlib.Path
+    """
+    return Path(path) / '..' / 'old'
+
+
+def list_backups(path):
+    """Return the backups of a site, oldest first.
+
+    :param path: the path the site is rendered to.
+    :type path: pathlib.Path
+
+    :rtype: list
+    """
+    directory = backups_path(path)
+    if not directory.is_dir():
+        return []
+    backups = [b for b in directory.glob('site_*') if _backup_time(b) is not None]
+    return sorted(backups, key=_backup_time)
+
+
+def _backup_time(backup):
+    "Return the time a backup was made, from its name, or None."
+    name = backup.name[:-len('.zip')] if backup.name.endswith('.zip') else backup.name
+    try:
+        return float(name[len('site_'):])
+    except ValueError:
+        return None
+
+
+def make_backup(path, method='zip'):
+    """Back up the site rendered to path.
+
+    :param path: the path the site is rendered to.
+    :type path: pathlib.Path
+
+    :param method: 'zip', to compress the site into an archive, or
+                   'hardlink', to make a directory of hardlinks to it.
+    :type method: str
+
+    :returns: the path of the backup.
+    :rtype: pathlib.Path
+    """
+    if method not in BACKUP_METHODS:
+        raise ValueError(f"Backup method must be one of {BACKUP_METHODS}, not '{method}'.")
+    backup = backups_path(path) / f'site_{time.time()}'
+    if method == 'zip':
+        return Path(shutil.make_archive(backup, 'zip', path))
+    link_tree(Path(path).resolve(), backup)
+    return backup
+
+
+def prune_backups(path, keep=None, max_size=None):
+    """Delete the oldest backups of a site.
+
+    :param path: the path the site is rendered to.
+    :type path: pathlib.Path
+
+    :param keep: if given, the most backups to keep.
+    :type keep: int
+
+    :param max_size: if given, the most bytes the backups may use
+                     between them. Files hardlinked into more than one
+                     backup are only counted once.
+    :type max_size: int
+    """
+    backups = list_backups(path)
+    if keep is not None:
+        while len(backups) > keep:
+            _remove(backups.pop(0))
+    if max_size is not None:
+        while len(backups) > 1 and tree_size(backups) > max_size:
+            _remove(backups.pop(0))
+
+
+def _remove(backup):
+    if backup.is_dir():
+        shutil.rmtree(backup)
+    else:
+        backup.unlink()
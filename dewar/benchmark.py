@@ -0,0 +1,359 @@
+"""Benchmarks of dewar's render pipeline, run on synthetic sites::
+
+    $ dewar benchmark --output before.json
+    $ dewar benchmark --compare before.json
+
+Each benchmark is run a number of times, and the fastest and mean times
+are reported along with the size of the site it ran on, so that the
+results of different versions of dewar can be compared.
+"""
+from collections import namedtuple
+from contextlib import contextmanager
+from pathlib import Path
+
+import gc
+import platform
+import tempfile
+import time
+
+from dewar.dewar import Site
+from dewar.helpers import (
+    load_md, load_md_data, load_pymd, load_pymd_data, render_template, url_for
+)
+from dewar.parser import fill_path, parse_path
+from dewar._internal import get_closest_site
+
+Scale = namedtuple('Scale', 'pages sections entries links paragraphs static_files calls')
+Scale.__doc__ = """The size of a synthetic site.
+
+:param pages: how many page functions that make one page each.
+:param sections: how many sections the parameterised entries are in.
+:param entries: how many entries each section has.
+:param links: how many other entries each entry links to.
+:param paragraphs: how many paragraphs the markdown and pymd files have.
+:param static_files: how many files the static tree has.
+:param calls: how many times the benchmarks of single functions (such
+              as `parse_path`) call them.
+"""
+
+SCALES = {
+    'small': Scale(20, 4, 25, 5, 50, 50, 1000),
+    'medium': Scale(100, 10, 100, 10, 500, 500, 10000),
+    'large': Scale(500, 20, 250, 20, 5000, 5000, 100000),
+}
+
+BENCHMARKS = {}
+
+
+def benchmark(name):
+    """A decorator that registers a benchmark with the given name.
+
+    The function it decorates takes the directory of a synthetic site
+    and its `Scale`, does any setup, and yields the function to time. It
+    is made a context manager, which is entered each time the benchmark
+    is run, so the setup isn't timed.
+
+    :param name: the name of the benchmark.
+    :type name: str
+    """
+    def decorator(func):
+        BENCHMARKS[name] = contextmanager(func)
+        return func
+
+    return decorator
+
+
+BASE_TEMPLATE = """<!doctype html>
+<html><head><title>{% block title %}{% endblock %}</title></head>
+<body>{% block body %}{% endblock %}</body></html>
+"""
+
+ENTRY_TEMPLATE = """{% extends 'base.html' %}
+{% block title %}{{ section }}/{{ entry }}{% endblock %}
+{% block body %}
+<h1>Entry {{ entry }} of section {{ section }}</h1>
+<ul>
+{% for link_section, link_entry in links %}
+  <li><a href="{{ url_for('entry', section=link_section, entry=link_entry) }}">{{ link_entry }}</a></li>
+{% endfor %}
+</ul>
+{% endblock %}
+"""
+
+PARAGRAPH = """## Heading {number}
+
+Some *emphasised* and **strong** text, with `code` and a [link](https://example.com/{number}).
+
+- an item
+- another item
+"""
+
+
+def make_site_files(path, scale):
+    """Write the templates, data and static files of a synthetic site.
+
+    :param path: the directory to write the site to.
+    :type path: pathlib.Path
+
+    :param scale: the size of the site.
+    :type scale: Scale
+    """
+    templates = path / 'templates'
+    templates.mkdir(parents=True, exist_ok=True)
+    (templates / 'base.html').write_text(BASE_TEMPLATE)
+    (templates / 'entry.html').write_text(ENTRY_TEMPLATE)
+
+    data = path / 'data'
+    data.mkdir(exist_ok=True)
+    markdown = '\n'.join(PARAGRAPH.format(number=n) for n in range(scale.paragraphs))
+    (data / 'post.md').write_text(markdown)
+    code = '\n'.join(f'value_{n} = {n} * 2' for n in range(scale.paragraphs))
+    (data / 'post.pymd').write_text(f'~~~\n{code}\n~~~\n{markdown}')
+
+    for n in range(scale.static_files):
+        static_file = path / 'static' / f'dir_{n % 10}' / f'dir_{n % 7}' / f'file_{n}.css'
+        static_file.parent.mkdir(parents=True, exist_ok=True)
+        static_file.write_text(f'.class-{n} {{ margin: {n}px; }}\n' * 20)
+
+
+def _links(section, entry, scale):
+    "Return the entries an entry links to, which are spread over sections."
+    return [
+        (f's{(section + n) % scale.sections}', f'e{(entry * 7 + n) % scale.entries}')
+        for n in range(1, scale.links + 1)
+    ]
+
+
+def make_site(path, scale, **kwargs):
+    """Return a synthetic site, with files written by `make_site_files`.
+
+    Its page functions are `page_<n>` (at `pages/<n>.html`), which each
+    make one page; `entry` (at `<section>/<entry>.html`), which makes
+    every entry from a template, each linking to other entries with
+    `url_for`; and `post`, which renders the markdown and pymd data.
+
+    :param path: the directory the site's files were written to.
+    :type path: pathlib.Path
+
+    :param scale: the size of the site.
+    :type scale: Scale
+
+    :param kwargs: other arguments to `Site`.
+
+    :rtype: Site
+    """
+    kwargs.setdefault('create_backups', False)
+    site = Site(path=path, **kwargs)
+
+    for n in range(scale.pages):
+        def page(n=n):
+            return f'<p>Page {n}, linking to <a href="{url_for("post")}">the post</a></p>'
+        page.__name__ = f'page_{n}'
+        site.register(f'pages/{n}.html')(page)
+
+    @site.register('<section>/<entry>.html')
+    def entry():
+        return {
+            (f's{section}', f'e{entry}'): render_template(
+                'entry.html', section=section, entry=entry,
+                links=_links(section, entry, scale),
+            )
+            for section in range(scale.sections)
+            for entry in range(scale.entries)
+        }
+
+    @site.register('post.html')
+    def post():
+        variables, html = load_pymd_data('post.pymd')
+        return load_md_data('post.md') + html + str(len(variables))
+
+    return site
+
+
+@contextmanager
+def _site(path, scale, **kwargs):
+    "A synthetic site, which is closed afterwards."
+    site = make_site(path, scale, **kwargs)
+    try:
+        yield site
+    finally:
+        site.close()
+
+
+@benchmark('render')
+def bench_render(path, scale):
+    "Render a synthetic site from scratch."
+    with _site(path, scale) as site:
+        yield lambda: site.render(path / 'dist')
+
+
+@benchmark('render_parallel')
+def bench_render_parallel(path, scale):
+    "Render a synthetic site from scratch, with four worker threads."
+    with _site(path, scale) as site:
+        yield lambda: site.render(path / 'dist', workers=4)
+
+
+@benchmark('render_incremental')
+def bench_render_incremental(path, scale):
+    "Render a synthetic site again, when nothing has changed."
+    with _site(path, scale) as site:
+        site.render(path / 'dist', incremental=True)
+    with _site(path, scale) as site:
+        yield lambda: site.render(path / 'dist', incremental=True)
+
+
+@benchmark('parse_path')
+def bench_parse_path(path, scale):
+    "Find the variables in many different paths."
+    paths = [f'section_{n % 100}/<category>/<page>.html' for n in range(scale.calls)]
+    yield lambda: [parse_path(p) for p in paths]
+
+
+@benchmark('fill_path')
+def bench_fill_path(path, scale):
+    "Fill in the variables of a path many times."
+    params = [(f'c{n}', f'p{n}') for n in range(scale.calls)]
+    yield lambda: [fill_path('<category>/<page>.html', p) for p in params]
+
+
+def _in_page(site, func):
+    "Return a function that calls func from a page function of site."
+    @site.register('benchmark.html', validate=False)
+    def in_page():
+        func()
+        return ''
+
+    return in_page
+
+
+@benchmark('get_closest_site')
+def bench_get_closest_site(path, scale):
+    "Find the current site from within a page function, many times."
+    with _site(path, scale) as site:
+        def find_sites():
+            for _ in range(scale.calls):
+                get_closest_site()
+        yield _in_page(site, find_sites)
+
+
+@benchmark('load_md')
+def bench_load_md(path, scale):
+    "Render a large markdown file."
+    text = (path / 'data' / 'post.md').read_text()
+    with _site(path, scale) as site:
+        yield _in_page(site, lambda: load_md(text))
+
+
+@benchmark('load_pymd')
+def bench_load_pymd(path, scale):
+    "Run and render a large pymd file."
+    text = (path / 'data' / 'post.pymd').read_text()
+    with _site(path, scale) as site:
+        yield _in_page(site, lambda: load_pymd(text))
+
+
+@benchmark('render_template')
+def bench_render_template(path, scale):
+    "Render a template that links to other pages, once for each entry."
+    with _site(path, scale) as site:
+        def render_entries():
+            for section in range(scale.sections):
+                for entry in range(scale.entries):
+                    render_template('entry.html', section=section, entry=entry,
+                                    links=_links(section, entry, scale))
+        yield _in_page(site, render_entries)
+
+
+def _dewar_version():
+    try:
+        from importlib.metadata import PackageNotFoundError, version
+        return version('dewar')
+    except PackageNotFoundError:
+        return None
+
+
+def run_benchmarks(names=None, scale='small', repeat=3):
+    """Run benchmarks on a synthetic site, made in a temporary directory.
+
+    :param names: the benchmarks to run (see `BENCHMARKS`), or None to run
+                  all of them.
+    :type names: list
+
+    :param scale: the name of a scale in `SCALES`.
+    :type scale: str
+
+    :param repeat: how many times to run each benchmark.
+    :type repeat: int
+
+    :returns: results that can be saved as JSON: the versions of dewar
+              and python, the size of the site, and the fastest and mean
+              time (in seconds) of each benchmark.
+    :rtype: dict
+    """
+    names = list(BENCHMARKS) if names is None else names
+    for name in names:
+        if name not in BENCHMARKS:
+            raise ValueError(f"Benchmark must be one of {tuple(BENCHMARKS)}, not '{name}'.")
+    if scale not in SCALES:
+        raise ValueError(f"Scale must be one of {tuple(SCALES)}, not '{scale}'.")
+    sizes = SCALES[scale]
+
+    results = {}
+    with tempfile.TemporaryDirectory(prefix='dewar-benchmark-') as path:
+        path = Path(path)
+        make_site_files(path, sizes)
+        for name in names:
+            times = []
+            for _ in range(repeat):
+                with BENCHMARKS[name](path, sizes) as run:
+                    gc.collect()
+                    start = time.perf_counter()
+                    run()
+                    times.append(time.perf_counter() - start)
+            results[name] = {
+                'min': min(times),
+                'mean': sum(times) / len(times),
+                'times': times,
+            }
+
+    return {
+        'dewar': _dewar_version(),
+        'python': platform.python_version(),
+        'implementation': platform.python_implementation(),
+        'scale': scale,
+        'sizes': sizes._asdict(),
+        'benchmarks': results,
+    }
+
+
+def compare(baseline, results, tolerance=0.1):
+    """Compare the results of `run_benchmarks` with earlier results.
+
+    Benchmarks are compared by their fastest time, which is the least
+    affected by anything else the machine was doing.
+
+    :param baseline: earlier results.
+    :type baseline: dict
+
+    :param results: the results to compare with them.
+    :type results: dict
+
+    :param tolerance: how much slower (as a fraction) a benchmark can get
+                      before it counts as a regression.
+    :type tolerance: float
+
+    :returns: a dict of each benchmark in both results to the ratio of
+              its new time to its old time, and a list of the names of
+              the benchmarks that regressed.
+    :rtype: tuple(dict, list)
+    """
+    if baseline.get('sizes') != results.get('sizes'):
+        raise ValueError("Can't compare benchmarks run on sites of different sizes.")
+    ratios = {
+        name: result['min'] / baseline['benchmarks'][name]['min']
+        for name, result in results['benchmarks'].items()
+        if name in baseline['benchmarks']
+    }
+    regressions = [name for name, ratio in ratios.items() if ratio > 1 + tolerance]
+    return ratios, regressions
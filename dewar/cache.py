@@ -0,0 +1,127 @@
+"""A cache that keeps values on disk between builds."""
+from pathlib import Path
+
+import hashlib
+import os
+import pickle
+import shutil
+import threading
+
+
+class DiskCache:
+    """A cache of pickled values stored in a directory, with one file
+    per key.
+
+    Values are written to a temporary file and then moved into place,
+    so concurrent builds never read a partially written value.
+
+    :param path: the directory to store values in. It is created when
+                 the first value is stored.
+    :type path: pathlib.Path or str
+
+    :param max_size: if given, the most bytes to store. When a value is
+                     stored that takes the cache over it, the least
+                     recently used values are removed until the cache is
+                     down to three quarters of it.
+    :type max_size: int
+    """
+
+    def __init__(self, path, max_size=None):
+        self.path = Path(path)
+        self.max_size = max_size
+        self._size = None
+        self._lock = threading.Lock()
+
+    def _file(self, key):
+        digest = hashlib.sha256(key.encode('utf-8')).hexdigest()
+        return self.path / digest[:2] / digest
+
+    def _files(self):
+        return [p for p in self.path.glob('*/*') if not p.name.endswith('.tmp')]
+
+    def get(self, key, default=None):
+        """Return the value stored for key, or default if there isn't one
+        (or it can't be read).
+
+        :param key: the key the value was stored with.
+        :type key: str
+        """
+        path = self._file(key)
+        try:
+            with open(path, 'rb') as cache_file:
+                value = pickle.load(cache_file)
+        except (OSError, pickle.UnpicklingError, EOFError):
+            return default
+        if self.max_size is not None:
+            # the modification time orders values by when they were last used.
+            try:
+                os.utime(path)
+            except OSError:
+                pass
+        return value
+
+    def set(self, key, value):
+        """Store a value for key.
+
+        :param key: the key to store the value with.
+        :type key: str
+        :param value: any value that can be pickled.
+        """
+        path = self._file(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        temp_path = path.with_name(f'{path.name}.{os.getpid()}.{threading.get_ident()}.tmp')
+        try:
+            with open(temp_path, 'wb') as cache_file:
+                pickle.dump(value, cache_file, protocol=pickle.HIGHEST_PROTOCOL)
+        except BaseException:
+            temp_path.unlink(missing_ok=True)
+            raise
+        added = temp_path.stat().st_size
+        try:
+            added -= path.stat().st_size
+        except FileNotFoundError:
+            pass
+        os.replace(temp_path, path)
+
+        if self.max_size is not None:
+            with self._lock:
+                if self._size is None:
+                    self._size = self.size()
+                else:
+                    self._size += added
+                if self._size > self.max_size:
+                    self._evict(self.max_size * 3 // 4)
+
+    def _evict(self, target):
+        "Remove the least recently used values until the cache is below target."
+        entries = []
+        for path in self._files():
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        entries.sort()
+
+        self._size = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if self._size <= target:
+                break
+            path.unlink(missing_ok=True)
+            self._size -= size
+
+    def size(self):
+        """Return the number of bytes stored in the cache."""
+        total = 0
+        for path in self._files():
+            try:
+                total += path.stat().st_size
+            except FileNotFoundError:
+                pass
+        return total
+
+    def clear(self):
+        """Remove every value in the cache."""
+        with self._lock:
+            shutil.rmtree(self.path, ignore_errors=True)
+            self._size = 0
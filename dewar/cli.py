@@ -0,0 +1,149 @@
+"""The `dewar` command, which runs tasks on a site defined in a python
+file (`site.py` by default)::
+
+    $ dewar compile-templates
+    $ dewar --site path/to/site.py clear-cache freeze_func
+    $ dewar serve --port 8000
+    $ dewar benchmark --scale medium --output results.json
+"""
+import argparse
+import json
+import runpy
+import sys
+
+from dewar.dewar import Site
+
+
+def load_site(path):
+    """Run a python file, and return the site it defines.
+
+    The file is run with a `__name__` other than `'__main__'`, so a
+    `site.render()` guarded by `if __name__ == "__main__":` doesn't run.
+
+    :param path: the path to the python file.
+    :type path: str or pathlib.Path
+
+    :rtype: Site
+    """
+    module_globals = runpy.run_path(str(path), run_name='__dewar_site__')
+    sites = [value for value in module_globals.values() if isinstance(value, Site)]
+    if not sites:
+        raise RuntimeError(f"{path} does not define a dewar Site.")
+    return sites[-1]
+
+
+def compile_templates(site, args):
+    "Compile every template of a site into its bytecode cache."
+    names = site.compile_templates()
+    print(f"Compiled {len(names)} templates.")
+
+
+def clear_cache(site, args):
+    "Remove values kept in a site's cache directory."
+    site.clear_cache(args.name)
+    print(f"Cleared {site.cache_path / args.name if args.name else site.cache_path}.")
+
+
+def serve(site, args):
+    "Serve a site for development, rendering pages as they are requested."
+    site.serve(args.host, args.port, watch=not args.no_watch)
+
+
+def benchmark(site, args):
+    "Run dewar's benchmarks, which don't need a site."
+    from dewar import benchmark
+
+    ratios, regressions = {}, []
+    try:
+        results = benchmark.run_benchmarks(args.names or None, args.scale, args.repeat)
+        if args.compare:
+            with open(args.compare) as baseline_file:
+                baseline = json.load(baseline_file)
+            ratios, regressions = benchmark.compare(baseline, results, args.tolerance)
+    except (OSError, ValueError) as e:
+        sys.exit(f"dewar: {e}")
+
+    for name, result in results['benchmarks'].items():
+        line = f"{name:<20} min {result['min']:.6f}s  mean {result['mean']:.6f}s"
+        if name in ratios:
+            line += f"  x{ratios[name]:.2f}" + ("  REGRESSION" if name in regressions else "")
+        print(line)
+
+    if args.output:
+        with open(args.output, 'w') as output_file:
+            json.dump(results, output_file, indent=2)
+    if regressions:
+        sys.exit(1)
+
+
+def make_parser():
+    """Return the argument parser for the `dewar` command.
+
+    Each subcommand sets `func` to a function that takes the loaded site
+    and the parsed arguments. Subcommands that don't need a site set
+    `needs_site` to False, and are passed None instead.
+    """
+    parser = argparse.ArgumentParser(prog='dewar', description=__doc__.split('\n')[0])
+    parser.add_argument('-s', '--site', default='site.py',
+                        help="the python file that defines the site (default: site.py)")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    compile_parser = commands.add_parser(
+        'compile-templates', help="compile every template into the bytecode cache"
+    )
+    compile_parser.set_defaults(func=compile_templates)
+
+    clear_parser = commands.add_parser(
+        'clear-cache', help="remove values kept in the site's cache directory"
+    )
+    clear_parser.add_argument('name', nargs='?',
+                              help="the cache to clear, such as 'freeze_func' (default: all)")
+    clear_parser.set_defaults(func=clear_cache)
+
+    serve_parser = commands.add_parser(
+        'serve', help="serve the site for development, reloading it when files change"
+    )
+    serve_parser.add_argument('--host', default='127.0.0.1',
+                              help="the address to listen on (default: 127.0.0.1)")
+    serve_parser.add_argument('-p', '--port', type=int, default=8000,
+                              help="the port to listen on (default: 8000)")
+    serve_parser.add_argument('--no-watch', action='store_true',
+                              help="don't watch the site's files for changes")
+    serve_parser.set_defaults(func=serve)
+
+    benchmark_parser = commands.add_parser(
+        'benchmark', help="time dewar on synthetic sites, and compare with earlier results"
+    )
+    benchmark_parser.add_argument('names', nargs='*',
+                                  help="the benchmarks to run (default: all)")
+    benchmark_parser.add_argument('--scale', default='small',
+                                  choices=('small', 'medium', 'large'),
+                                  help="the size of the synthetic sites (default: small)")
+    benchmark_parser.add_argument('--repeat', type=int, default=3,
+                                  help="how many times to run each benchmark (default: 3)")
+    benchmark_parser.add_argument('-o', '--output',
+                                  help="a file to write the results to, as JSON")
+    benchmark_parser.add_argument('--compare',
+                                  help="a file of earlier results; exit with an error "
+                                       "if a benchmark got slower")
+    benchmark_parser.add_argument('--tolerance', type=float, default=0.1,
+                                  help="how much slower a benchmark may get, as a "
+                                       "fraction (default: 0.1)")
+    benchmark_parser.set_defaults(func=benchmark, needs_site=False)
+    return parser
+
+
+def main(argv=None):
+    """Run the `dewar` command.
+
+    :param argv: the arguments to the command, or None to use sys.argv.
+    """
+    parser = make_parser()
+    args = parser.parse_args(argv)
+    site = None
+    if getattr(args, 'needs_site', True):
+        try:
+            site = load_site(args.site)
+        except (OSError, RuntimeError) as e:
+            parser.exit(1, f"dewar: {e}\n")
+    return args.func(site, args)
@@ -0,0 +1,262 @@
+"""Functions for writing precompressed copies of rendered files.
+
+Each compressed copy is a sibling of the file it was made from, with
+the format's suffix added to its name (`index.html` is compressed to
+`index.html.gz` and `index.html.br`), which is where servers such as
+nginx (with `gzip_static`) look for them.
+
+Brotli is only available if the `brotli` package is installed.
+"""
+from collections import namedtuple
+from pathlib import Path
+
+import os
+import zlib
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+COMPRESSION_SUFFIXES = {
+    'gzip': '.gz',
+    'br': '.br',
+}
+
+COMPRESSION_FORMATS = tuple(COMPRESSION_SUFFIXES)
+
+# Files smaller than this are rarely worth compressing.
+DEFAULT_MIN_SIZE = 1024
+
+# Types of file whose content is already compressed.
+COMPRESSED_TYPES = frozenset({
+    '.gz', '.br', '.zst', '.bz2', '.xz', '.zip', '.7z',
+    '.png', '.jpg', '.jpeg', '.gif', '.webp', '.avif',
+    '.woff', '.woff2', '.mp3', '.mp4', '.ogg', '.webm',
+})
+
+
+def check_formats(formats):
+    """Raise an error if the given compression formats can't be used.
+
+    :param formats: compression formats, such as ('gzip', 'br').
+    :type formats: tuple
+
+    :raises ValueError: if a format isn't one of `COMPRESSION_FORMATS`.
+    :raises RuntimeError: if 'br' is given, but `brotli` isn't installed.
+    """
+    for compression_format in formats:
+        if compression_format not in COMPRESSION_SUFFIXES:
+            raise ValueError(
+                f"Compression format must be one of {COMPRESSION_FORMATS}, not '{compression_format}'."
+            )
+    if 'br' in formats and brotli is None:
+        raise RuntimeError("The 'brotli' package must be installed to compress files with brotli.")
+
+
+def _compressor(compression_format):
+    "Return an object with compress(data) and flush() methods for the format."
+    if compression_format == 'gzip':
+        # a wbits of 16 + 15 writes a gzip header, with no timestamp in
+        # it, so the same content is always compressed to the same bytes.
+        return zlib.compressobj(9, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    return _BrotliCompressor()
+
+
+class _BrotliCompressor:
+    "Gives a brotli.Compressor the same interface as zlib's compressors."
+
+    def __init__(self):
+        self._compressor = brotli.Compressor()
+
+    def compress(self, data):
+        return self._compressor.process(data)
+
+    def flush(self):
+        return self._compressor.finish()
+
+
+def compress(data, compression_format):
+    """Return data compressed with the given format.
+
+    :param data: the data to compress.
+    :type data: bytes
+
+    :param compression_format: 'gzip' or 'br'.
+    :type compression_format: str
+
+    :rtype: bytes
+    """
+    compressor = _compressor(compression_format)
+    return compressor.compress(data) + compressor.flush()
+
+
+def _replace(path, data, mtime_ns):
+    """Write data to path by replacing the file there, and give it the
+    modification time mtime_ns.
+    """
+    temp_path = path.with_name(f'.{path.name}.tmp')
+    temp_path.write_bytes(data)
+    os.utime(temp_path, ns=(mtime_ns, mtime_ns))
+    os.replace(temp_path, path)
+
+
+class Compression(namedtuple('Compression', 'formats min_size')):
+    """How a site compresses the files it renders.
+
+    :param formats: the formats to compress files with.
+    :param min_size: the size, in bytes, below which files aren't
+                     compressed.
+    """
+    __slots__ = ()
+
+    def siblings(self, path):
+        """Return the paths the compressed copies of path are kept at.
+
+        :param path: the path of a rendered file.
+        :type path: pathlib.Path
+
+        :rtype: list
+        """
+        path = Path(path)
+        return [
+            path.with_name(path.name + COMPRESSION_SUFFIXES[compression_format])
+            for compression_format in self.formats
+        ]
+
+    def applies(self, path, size):
+        """Return whether a file at path, of the given size, should be
+        compressed.
+        """
+        return size >= self.min_size and Path(path).suffix.lower() not in COMPRESSED_TYPES
+
+    def is_current(self, path):
+        """Return whether the compressed copies of path are up to date:
+        that is, whether they exist, and have the same modification time
+        as it. Copies are given the modification time of the file they
+        were made from, so a file replaced by one with an older time
+        (such as a static file restored from a backup, which sync_tree
+        copies with its time) is still compressed again. If path
+        shouldn't be compressed, it is up to date if it has no copies.
+
+        :param path: the path of a rendered file.
+        :type path: pathlib.Path
+
+        :rtype: bool
+        """
+        stat = path.stat()
+        if not self.applies(path, stat.st_size):
+            return not any(sibling.exists() for sibling in self.siblings(path))
+        try:
+            return all(
+                sibling.stat().st_mtime_ns == stat.st_mtime_ns
+                for sibling in self.siblings(path)
+            )
+        except FileNotFoundError:
+            return False
+
+    def write(self, path, data, mtime_ns=None):
+        """Write compressed copies of data, the content of the file at
+        path. If it shouldn't be compressed, remove any old copies.
+
+        :param path: the path of a rendered file.
+        :type path: pathlib.Path
+
+        :param data: the content of the file.
+        :type data: bytes
+
+        :param mtime_ns: the modification time of the file data was read
+                         from, if it isn't the time of the file at path
+                         now.
+        :type mtime_ns: int
+        """
+        if not self.applies(path, len(data)):
+            self.remove(path)
+            return
+        if mtime_ns is None:
+            mtime_ns = path.stat().st_mtime_ns
+        for compression_format, sibling in zip(self.formats, self.siblings(path)):
+            _replace(sibling, compress(data, compression_format), mtime_ns)
+
+    def remove(self, path):
+        "Remove any compressed copies of the file at path."
+        for sibling in self.siblings(path):
+            sibling.unlink(missing_ok=True)
+
+    def stream(self, path):
+        """Return a `CompressedStream`, to compress the content of the
+        file at path as it is written.
+        """
+        return CompressedStream(self, path)
+
+
+class CompressedStream:
+    """Compresses a file in chunks, as it is written, so that its
+    content never has to be read back. Data is compressed to temporary
+    files, which are only put in place by `commit`.
+
+    :param compression: a `Compression`.
+    :param path: the path of the file being written.
+    """
+
+    def __init__(self, compression, path):
+        self.compression = compression
+        self.path = Path(path)
+        self.size = 0
+        self._files = []
+        for compression_format, sibling in zip(compression.formats, compression.siblings(path)):
+            temp_path = sibling.with_name(f'.{sibling.name}.tmp')
+            self._files.append(
+                (_compressor(compression_format), open(temp_path, 'wb'), temp_path, sibling)
+            )
+
+    def update(self, data):
+        "Compress the next chunk of the file."
+        self.size += len(data)
+        for compressor, temp_file, _, _ in self._files:
+            temp_file.write(compressor.compress(data))
+
+    def _close(self):
+        for compressor, temp_file, _, _ in self._files:
+            if not temp_file.closed:
+                temp_file.write(compressor.flush())
+                temp_file.close()
+
+    def commit(self):
+        """Put the compressed copies in place, or remove any old copies if
+        the file shouldn't be compressed. The file must be written first,
+        as the copies are given its modification time.
+        """
+        self._close()
+        if not self.compression.applies(self.path, self.size):
+            self.discard()
+            self.compression.remove(self.path)
+            return
+        mtime_ns = self.path.stat().st_mtime_ns
+        for _, _, temp_path, sibling in self._files:
+            os.utime(temp_path, ns=(mtime_ns, mtime_ns))
+            os.replace(temp_path, sibling)
+
+    def discard(self):
+        "Remove the compressed copies without putting them in place."
+        for _, temp_file, temp_path, _ in self._files:
+            temp_file.close()
+            temp_path.unlink(missing_ok=True)
+
+
+def compress_file(path, compression):
+    """Write compressed copies of the file at path, unless they are
+    already up to date.
+
+    :param path: the path of a rendered file.
+    :type path: pathlib.Path
+
+    :param compression: how to compress it.
+    :type compression: Compression
+    """
+    path = Path(path)
+    if compression.is_current(path):
+        return
+    mtime_ns = path.stat().st_mtime_ns
+    compression.write(path, path.read_bytes(), mtime_ns)
@@ -0,0 +1,154 @@
+"""Reading a site's data files.
+
+The contents of data files are kept in memory, in a `DataCache`, keyed
+by their path, modification time and size, so pages that read the same
+files only read them from disk once, and a changed file is read again.
+"""
+from collections import OrderedDict
+from collections.abc import Mapping
+from pathlib import Path
+
+import mmap
+import os
+import stat
+import threading
+
+from dewar.tracking import record_dependency
+
+# The ways a data file can be read: as text, as bytes, or as a read-only
+# memory map of the file (which isn't cached, as only the parts of it
+# that are used are read).
+DATA_MODES = ('text', 'bytes', 'mmap')
+
+# The most bytes of data to keep in memory.
+DATA_CACHE_MAX_SIZE = 64 * 1024 * 1024
+
+
+class DataCache:
+    """The contents of data files, kept in memory until the files change.
+
+    A file is read again if its modification time or size changed since
+    it was last read. When the cache goes over its maximum size, the
+    least recently read files are forgotten.
+
+    :param max_size: the most bytes of files to keep.
+    :type max_size: int
+    """
+
+    def __init__(self, max_size=DATA_CACHE_MAX_SIZE):
+        self.max_size = max_size
+        self.size = 0
+        self._files = OrderedDict()
+        self._lock = threading.Lock()
+
+    def read(self, path, mode='text'):
+        """Return the content of a file, reading it only if it changed.
+
+        :param path: the path of the file.
+        :type path: pathlib.Path or str
+
+        :param mode: one of `DATA_MODES`.
+        :type mode: str
+
+        :returns: the text, bytes or memory map of the file. A memory map
+                  of an empty file can't be made, so b'' is returned for
+                  one instead.
+        :rtype: str, bytes or mmap.mmap
+
+        :raises ValueError: if there is no file at path.
+        """
+        if mode not in DATA_MODES:
+            raise ValueError(f"Data mode must be one of {DATA_MODES}, not '{mode}'.")
+        path = os.fspath(path)
+        try:
+            file_stat = os.stat(path)
+        except (FileNotFoundError, NotADirectoryError):
+            file_stat = None
+        if file_stat is None or not stat.S_ISREG(file_stat.st_mode):
+            raise ValueError('The given path is not a file.')
+
+        if mode == 'mmap':
+            if file_stat.st_size == 0:
+                return b''
+            with open(path, 'rb') as data_file:
+                return mmap.mmap(data_file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        key = (path, mode)
+        version = (file_stat.st_mtime_ns, file_stat.st_size)
+        with self._lock:
+            cached = self._files.get(key)
+            if cached is not None and cached[0] == version:
+                self._files.move_to_end(key)
+                return cached[1]
+
+        with open(path, 'rb') as data_file:
+            content = data_file.read()
+        if mode == 'text':
+            # translate newlines as Path.read_text does, so the cache
+            # doesn't change what callers get back.
+            content = content.decode('utf-8').replace('\r\n', '\n').replace('\r', '\n')
+
+        if file_stat.st_size <= self.max_size:
+            with self._lock:
+                old = self._files.pop(key, None)
+                if old is not None:
+                    self.size -= old[0][1]
+                self._files[key] = version, content
+                self.size += file_stat.st_size
+                while self.size > self.max_size:
+                    (_, size), _ = self._files.popitem(last=False)[1]
+                    self.size -= size
+        return content
+
+    def clear(self):
+        "Forget the contents of every file."
+        with self._lock:
+            self._files.clear()
+            self.size = 0
+
+
+#: The cache used by `dewar.helpers.load_data` and `DataDir`.
+data_cache = DataCache()
+
+
+class DataDir(Mapping):
+    """A read-only dict of the names of the files in a directory to their
+    contents, which are only read when they are looked up.
+
+    A page function that looks up a file depends on it (and one that
+    creates a DataDir depends on the directory's listing).
+
+    :param path: the directory.
+    :type path: pathlib.Path
+
+    :param mode: how to read the files: one of `DATA_MODES`.
+    :type mode: str
+    """
+
+    def __init__(self, path, mode='text'):
+        if mode not in DATA_MODES:
+            raise ValueError(f"Data mode must be one of {DATA_MODES}, not '{mode}'.")
+        self.path = Path(path)
+        self.mode = mode
+        with os.scandir(self.path) as entries:
+            self._names = sorted(entry.name for entry in entries if entry.is_file())
+        self._name_set = set(self._names)
+
+    def __getitem__(self, name):
+        if name not in self._name_set:
+            raise KeyError(name)
+        file_path = self.path / name
+        record_dependency('data', file_path)
+        return data_cache.read(file_path, self.mode)
+
+    def __contains__(self, name):
+        return name in self._name_set
+
+    def __iter__(self):
+        return iter(self._names)
+
+    def __len__(self):
+        return len(self._names)
+
+    def __repr__(self):
+        return f'<DataDir {self.path} ({len(self)} files)>'
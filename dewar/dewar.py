@@ -1,18 +1,39 @@
-from collections import namedtuple
+from collections import deque, namedtuple
+from collections.abc import Iterable, Iterator, Mapping
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
+import contextvars
 import functools
+import hashlib
+import inspect
+import json
+import os
 import shutil
+import threading
 import time
 
 from proxy_tools import module_property
 
-from dewar.jinja import JINJA_FUNCTIONS
-from dewar.parser import fill_path
-from dewar.validator import validate_page
-from dewar._internal import get_caller_location, get_closest_site
+from dewar.cache import DiskCache
+from dewar.compression import DEFAULT_MIN_SIZE, Compression, check_formats, compress_file
+from dewar.backups import BACKUP_METHODS, make_backup, prune_backups
+from dewar.evaluation import Evaluation
+from dewar.exceptions import RenderError
+from dewar.files import COPY_METHODS, sync_tree
+from dewar.generations import (
+    activate, deactivate, new_generation, prune_generations, rollback
+)
+from dewar.jinja import JINJA_FUNCTIONS, StreamedTemplate, TrackingEnvironment
+from dewar.manifest import Manifest, content_digest, file_digest, manifest_path
+from dewar.parser import compile_path
+from dewar.profiling import BuildProfile, PageProfile, track_timings
+from dewar.registry import PageRegistry
+from dewar.tracking import DependencyGraph, record_dependency, track_dependencies
+from dewar.validator import validate_entry, validate_page
+from dewar._internal import get_caller_location, get_closest_site, page_context
 
-from jinja2 import Environment, FileSystemLoader, select_autoescape
+from jinja2 import FileSystemBytecodeCache, FileSystemLoader, select_autoescape
 
 
 @module_property
@@ -37,6 +58,24 @@ def site():
     raise RuntimeError("Site could not be found.")
 
 
+# When a page's entries are streamed to an executor, the most entries
+# waiting to be written at once.
+MAX_PENDING_WRITES = 64
+
+# How many characters of a static file's digest are put in its name.
+FINGERPRINT_LENGTH = 10
+
+# The name of the static manifest, in the rendered static directory.
+STATIC_MANIFEST = 'static-manifest.json'
+
+# The name of the file in the cache directory that keeps the digests of
+# static files, so unchanged files aren't hashed again.
+STATIC_DIGESTS = 'static-digests.json'
+
+# The size of the buffer used when writing a streamed page to disk.
+WRITE_BUFFER_SIZE = 1 << 16
+
+
 class Site:
     """This is the root class of any dewar project, that encapsulates
     all the pages in a project.
@@ -47,13 +86,86 @@ class Site:
 
     :param create_backups: whether to create backups of old sites.
     
-    :param static_render_path: whether to create backups of old sites.
+    :param static_render_path: the path in the rendered site to copy
+                               the `static/` directory to.
+
+    :param cache_path: the directory to keep caches in between builds.
+                       Defaults to `.dewar-cache/` in the site's path.
+
+    :param bytecode_cache: whether to keep compiled templates in the
+                           cache directory, so that later builds don't
+                           compile them again.
+
+    :param markdown_cache: whether to keep the html rendered from markdown
+                           in the cache directory, so that later builds
+                           don't render unchanged markdown again.
+
+    :param cache_max_size: if given, the most bytes each cache that the
+                           site keeps values in (see `get_cache`) may use.
+
+    :param backup_method: how to back up old sites: 'zip', to compress
+                          them into archives, or 'hardlink', to make
+                          directories of hardlinks to their files, which
+                          is near instant and takes almost no space.
+
+    :param keep_backups: if given, the most backups to keep.
+
+    :param max_backup_size: if given, the most bytes backups may use
+                            between them. The oldest backups are deleted
+                            to stay under it.
+
+    :param static_copy: how to copy static files into the rendered site:
+                        'copy', 'reflink' (a copy that shares its data
+                        with the original until either changes, where the
+                        filesystem supports it), or 'hardlink' (fastest,
+                        but then editing a file in the rendered site
+                        edits the original too).
+
+    :param fingerprint_static: whether to put a hash of each static
+                               file's content in its name (so
+                               `css/site.css` is rendered as
+                               `css/site.0123456789.css`). `static_url`
+                               links to the renamed files, so they can be
+                               cached forever: a changed file gets a new
+                               name.
+
+    :param compress: if given, the format (or formats) to write
+                     compressed copies of rendered files in, next to them,
+                     such as 'gzip' or ('gzip', 'br'), for servers that can
+                     serve precompressed files. 'br' needs the `brotli`
+                     package.
+
+    :param compress_min_size: the size, in bytes, below which rendered
+                              files aren't compressed.
     """
 
-    def __init__(self, path=None, static_render_path='static', create_backups=True):
-        self.registered_functions = set()
+    def __init__(self, path=None, static_render_path='static', create_backups=True,
+                 cache_path=None, bytecode_cache=False, markdown_cache=False,
+                 cache_max_size=None, backup_method='zip', keep_backups=None,
+                 max_backup_size=None, static_copy='copy', fingerprint_static=False,
+                 compress=None, compress_min_size=DEFAULT_MIN_SIZE):
+        self.registered_functions = PageRegistry()
+        self._evaluation = Evaluation()
         self.create_backups = create_backups
+        if backup_method not in BACKUP_METHODS:
+            raise ValueError(f"Backup method must be one of {BACKUP_METHODS}, not '{backup_method}'.")
+        self.backup_method = backup_method
+        self.keep_backups = keep_backups
+        self.max_backup_size = max_backup_size
         self.static_render_path = static_render_path
+        if static_copy not in COPY_METHODS:
+            raise ValueError(f"Copy method must be one of {COPY_METHODS}, not '{static_copy}'.")
+        self.static_copy = static_copy
+        self.fingerprint_static = fingerprint_static
+        self._static_manifest = None
+        self._static_digests = None
+        self.profile_hooks = []
+        self.compression = None
+        if isinstance(compress, str):
+            compress = (compress,)
+        if compress:
+            check_formats(compress)
+            self.compression = Compression(tuple(compress), compress_min_size)
 
         if path:
             self.path = Path(path)
@@ -62,10 +174,26 @@ class Site:
 
         self.template_path = self.path / 'templates'
         self.static_path = self.path / 'static'
+        self.cache_path = Path(cache_path) if cache_path else self.path / '.dewar-cache'
+
+        self.cache_max_size = cache_max_size
+        self._caches = {}
+        self._caches_lock = threading.Lock()
+
+        self.markdown_cache = None
+        if markdown_cache:
+            self.markdown_cache = self.get_cache('markdown')
 
-        self._jinja_env = Environment(
+        jinja_bytecode_cache = None
+        if bytecode_cache:
+            jinja_cache_path = self.cache_path / 'jinja'
+            jinja_cache_path.mkdir(parents=True, exist_ok=True)
+            jinja_bytecode_cache = FileSystemBytecodeCache(str(jinja_cache_path))
+
+        self._jinja_env = TrackingEnvironment(
             loader=FileSystemLoader(str(self.template_path), followlinks=True),
-            autoescape=select_autoescape(['html', 'xml'])
+            autoescape=select_autoescape(['html', 'xml']),
+            bytecode_cache=jinja_bytecode_cache,
         )
         for func in JINJA_FUNCTIONS:
             self._jinja_env.globals[func.__name__] = func
@@ -83,35 +211,205 @@ class Site:
         :param validate: If True, when the page function returns,
                          it will raise an error if it doesn't return
                          a value that can create a page/pages.
+
+        :raises ValueError: if another page function with the same name
+                            or path is already registered to this site.
         """
         if path.startswith('/'):
             raise ValueError("Path argument can't begin with a '/''")
 
         def decorator(f):
+            def evaluate():
+                # returns the state that what f returned is recorded in,
+                # too, as the page could be invalidated while f runs.
+                record_dependency('page', wrapper.name)
+                evaluation = self._evaluation
+                state = evaluation.claim(wrapper)
+                if state.done:
+                    return state.returned, state
+
+                try:
+                    with page_context(wrapper), track_dependencies() as dependencies, \
+                            track_timings() as timings:
+                        if wrapper._source_file:
+                            record_dependency('code', wrapper._source_file)
+                        start = time.perf_counter()
+                        content = f()
+                        timings['time'] += time.perf_counter() - start
+                        context = contextvars.copy_context()
+
+                    if isinstance(content, Iterator):
+                        # an iterator can only be consumed once, so it
+                        # isn't memoised; each call evaluates f again.
+                        state.dependencies = dependencies
+                        state.timings = timings
+                        entries = _stream_page(wrapper, content, context, timings, validate)
+                        return entries, state
+
+                    if validate:
+                        validate_page(wrapper, content)
+                    state.store(content, dependencies, timings)
+                    return content, state
+                finally:
+                    evaluation.release(state)
+
+            # functools.wraps keeps the module and qualname of f, so
+            # module level page functions can be pickled by reference
+            # and sent to a process pool by render().
+            @functools.wraps(f)
             def wrapper():
-                if hasattr(wrapper, '_returned'):
-                    return wrapper._returned
-                elif hasattr(wrapper, '_called'):
-                    raise RuntimeError("Calling functions within themselves not allowed!")
-                else:
-                    wrapper._called = True
-
-                content = f()
-                wrapper._returned = content
-                if validate:
-                    validate_page(wrapper)
-                return content
+                return evaluate()[0]
 
+            wrapper._evaluate = evaluate
             wrapper.name = f.__name__
             wrapper.__name__ = wrapper.name
             wrapper.path = path
+            wrapper.route = compile_path(path)
             wrapper._registered_to = self
+            wrapper.streams = inspect.isgeneratorfunction(f)
+            try:
+                wrapper._source_file = inspect.getsourcefile(f)
+            except TypeError:
+                wrapper._source_file = None
 
             self.registered_functions.add(wrapper)
             return wrapper
 
         return decorator
 
+    @property
+    def dependencies(self):
+        """The `dewar.tracking.DependencyGraph` of what each page function
+        read the last time it was evaluated, such as during a render.
+        Page functions that haven't been evaluated aren't in it.
+
+        For example, `site.dependencies.dependents('data/posts/x.md')` is
+        the names of the page functions that read that data file, and of
+        the page functions that called them.
+        """
+        return DependencyGraph(
+            {
+                name: state.dependencies
+                for name, state in self._evaluation.evaluated().items()
+            },
+            root=self.path,
+        )
+
+    def invalidate(self, pages=None):
+        """Forget what page functions returned, so that each is evaluated
+        again the next time it is called (or rendered).
+
+        Each render forgets what every page function returned anyway,
+        unless it is given `fresh=False`.
+
+        :param pages: page functions registered to this site, or their
+                      names, or None to forget every page function.
+        :type pages: list
+        """
+        if pages is not None:
+            pages = [func if isinstance(func, str) else func.name for func in pages]
+        self._evaluation.invalidate(pages)
+
+    def render_path(self, path):
+        """Render a single file of the site, without rendering the rest.
+
+        The path is matched against the paths of the registered page
+        functions (see `PageRegistry.matches`), and only the page
+        functions that match are evaluated, if they haven't been already,
+        until one of them creates the file. Use `invalidate` to have them
+        evaluated again.
+
+        :param path: the path of the file, relative to the rendered site,
+                     such as 'blog/my-post.html'.
+        :type path: str or pathlib.Path
+
+        :returns: the content of the file, or None if no page function
+                  creates it.
+        :rtype: str
+
+        :raises RenderError: if the page function raises an exception.
+                             It is evaluated again the next time.
+        """
+        path = Path(path).as_posix().lstrip('/')
+        for func, params in self.registered_functions.matches(path):
+            content, _, _ = _evaluate_page(func)
+            content = _entry_content(func, content, path, params)
+            if isinstance(content, StreamedTemplate):
+                return ''.join(content)
+            if content is not None:
+                return content
+        return None
+
+    def serve(self, host='127.0.0.1', port=8000, watch=True):
+        """Serve the site over HTTP for development, rendering each page
+        when it is requested. When a template, static or data file
+        changes, the pages that read it are evaluated again, and
+        browsers showing the site reload. See `dewar.server`.
+
+        This blocks until it is interrupted, such as by Ctrl-C.
+
+        :param host: The address to listen on.
+        :param port: The port to listen on.
+        :param watch: Whether to watch the site's files for changes.
+        """
+        from dewar.server import make_server
+
+        server = make_server(self, host, port, watch)
+        print(f"Serving on http://{host}:{server.server_address[1]}/")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+
+    def get_cache(self, name):
+        """Return the DiskCache with the given name, kept in a directory
+        of the same name in the site's cache directory.
+
+        :param name: the name of the cache, such as 'markdown'.
+        :type name: str
+
+        :rtype: dewar.cache.DiskCache
+        """
+        with self._caches_lock:
+            if name not in self._caches:
+                self._caches[name] = DiskCache(self.cache_path / name, self.cache_max_size)
+            return self._caches[name]
+
+    def clear_cache(self, name=None):
+        """Remove values kept in the site's cache directory.
+
+        :param name: the name of a cache to clear (such as 'markdown', or
+                     'freeze_func'), or None to clear every cache.
+        :type name: str
+        """
+        path = self.cache_path / name if name else self.cache_path
+        with self._caches_lock:
+            for cache_name, cache in self._caches.items():
+                if name is None or cache_name == name or cache_name.startswith(name + '/'):
+                    cache.clear()
+        shutil.rmtree(path, ignore_errors=True)
+
+        bytecode_cache = self._jinja_env.bytecode_cache
+        if bytecode_cache is not None:
+            Path(bytecode_cache.directory).mkdir(parents=True, exist_ok=True)
+
+    def compile_templates(self):
+        """Compile every template in the `templates/` directory ahead of
+        time. If the site has a bytecode cache, the compiled templates
+        are stored in it, so later builds can skip compiling them.
+
+        :returns: the names of the templates compiled.
+        :rtype: list
+        """
+        if not self.template_path.is_dir():
+            return []
+        names = self._jinja_env.list_templates()
+        for name in names:
+            self._jinja_env.get_template(name)
+        return names
+
     def close(self):
         """Remove a site from the global list of sites.
 
@@ -129,48 +427,646 @@ class Site:
         except ValueError:
             raise RuntimeError("Site Instance was already closed.")
 
-    def _render_file(self, path, content):
+    def _render_file(self, path, content, only_changed=False, previous_digest=None):
         """Renders a given file to a path. Used by the render function.
 
         :param path: a path to write to.
         :param content: content to be written to that path.
+        :param only_changed: if True, leave the file alone if it already
+                             has this content.
+        :param previous_digest: the digest of the file at path, if known.
+
+        :returns: the digest of the content.
+        """
+        return _write_file(path, content, only_changed, previous_digest, self.compression)
+
+    @property
+    def static_manifest(self):
+        """A dict of the path of each static file (relative to the
+        `static/` directory) to the path it is rendered to (relative to
+        `static_render_path`). These are the same unless the site
+        fingerprints its static files.
+
+        It is built the first time it is needed, and again on each render.
+        The digests of fingerprinted files are kept in the cache
+        directory, and files are only hashed again if their size or
+        modification time changed.
+        """
+        manifest = self._static_manifest
+        if manifest is None:
+            manifest = {}
+            digests = {}
+            if self.static_path.is_dir():
+                # symlinked directories are followed, as sync_tree does.
+                static_files = sorted(
+                    Path(parent) / name
+                    for parent, _, files in os.walk(self.static_path, followlinks=True)
+                    for name in files
+                )
+                for static_file in static_files:
+                    if not static_file.is_file():
+                        continue
+                    name = static_file.relative_to(self.static_path).as_posix()
+                    if self.fingerprint_static:
+                        digests[name] = self._static_digest(static_file, name)
+                        digest = digests[name][2][:FINGERPRINT_LENGTH]
+                        rendered = static_file.with_name(
+                            f'{static_file.stem}.{digest}{static_file.suffix}'
+                        )
+                        manifest[name] = rendered.relative_to(self.static_path).as_posix()
+                    else:
+                        manifest[name] = name
+            if self.fingerprint_static and digests != self._static_digests:
+                self._save_static_digests(digests)
+            self._static_manifest = manifest
+        return manifest
+
+    def _static_digest(self, static_file, name):
+        """Return the size, modification time and digest of a static
+        file, only hashing it if it changed since it was last hashed.
+
+        :param static_file: the path of the static file.
+        :param name: its path relative to the `static/` directory.
 
+        :rtype: list
         """
-        render_path_folder = path.parent
-        render_path_folder.mkdir(parents=True, exist_ok=True)
+        if self._static_digests is None:
+            try:
+                self._static_digests = json.loads(
+                    (self.cache_path / STATIC_DIGESTS).read_text()
+                )
+            except (FileNotFoundError, ValueError):
+                self._static_digests = {}
+        file_stat = static_file.stat()
+        version = [file_stat.st_size, file_stat.st_mtime_ns]
+        cached = self._static_digests.get(name)
+        if cached is not None and cached[:2] == version:
+            return cached
+        return version + [file_digest(static_file)]
 
-        with open(path, 'w') as render_file:
-            render_file.write(content)
+    def _save_static_digests(self, digests):
+        """Keep the digests of the static files, in memory and in the
+        cache directory.
+
+        :param digests: a dict of the name of each static file to what
+                        `_static_digest` returned for it.
+        """
+        self._static_digests = digests
+        self.cache_path.mkdir(parents=True, exist_ok=True)
+        digests_path = self.cache_path / STATIC_DIGESTS
+        temp_path = digests_path.with_name(f'.{STATIC_DIGESTS}.{os.getpid()}.tmp')
+        temp_path.write_text(json.dumps(digests, sort_keys=True))
+        os.replace(temp_path, digests_path)
 
-    def _render_static(self, path):
+    def _render_static(self, path, executor=None):
         """Renders all the static content to the given path
 
+        Only static files that changed since they were last copied to
+        path are copied again, and files deleted from the `static/`
+        directory are deleted from path. If the site fingerprints its
+        static files, the static manifest is also written, as
+        `static-manifest.json`. If the site compresses files, static
+        files whose compressed copies are out of date are compressed.
+
         :param path: The path to write to.
+        :param executor: A `concurrent.futures.Executor` to compress
+                         files in, or None to compress them in the
+                         current thread.
+
+        :returns: the set of files written, relative to path.
         """
+        self._static_manifest = None
         static_render_path = path / self.static_render_path
         if not self.static_path.exists():
-            return
-        shutil.copytree(self.static_path, static_render_path)
+            return set()
+        # only delete files that aren't static files if the static files
+        # have a directory to themselves.
+        synced = sync_tree(
+            self.static_path, static_render_path, self.static_copy,
+            delete=static_render_path.resolve() != path.resolve(),
+            names=self.static_manifest,
+            keep=self._compressed_names(
+                [*self.static_manifest.values(), STATIC_MANIFEST]
+            ),
+        )
+        if self.fingerprint_static:
+            manifest_json = json.dumps(self.static_manifest, indent=1, sort_keys=True)
+            self._render_file(static_render_path / STATIC_MANIFEST, manifest_json, only_changed=True)
+            synced.add(STATIC_MANIFEST)
+        if self.compression is not None:
+            compressing = [static_render_path / f for f in synced if f != STATIC_MANIFEST]
+            if executor is None:
+                for static_file in compressing:
+                    compress_file(static_file, self.compression)
+            else:
+                writes = [
+                    executor.submit(compress_file, static_file, self.compression)
+                    for static_file in compressing
+                ]
+                for write in writes:
+                    write.result()
+        return {
+            (static_render_path / f).relative_to(path).as_posix()
+            for f in synced
+        }
+
+    def _compressed_names(self, names):
+        """Return the names of the compressed copies of files with the
+        given names, if the site compresses files.
+
+        :param names: the names of rendered files, in posix form.
+
+        :rtype: set
+        """
+        if self.compression is None:
+            return set()
+        return {
+            sibling.as_posix()
+            for name in names
+            for sibling in self.compression.siblings(Path(name))
+        }
 
-    def render(self, path='./dist/'):
+    def _page_files(self, path, func, content):
+        """Given a page function and what it returned, yield a tuple of
+        (render_path, content) for every file that page creates.
+
+        :param path: The path the site is being rendered to.
+        :param func: The page function.
+        :param content: The value returned by `func`.
+        """
+        if isinstance(content, (str, StreamedTemplate)):
+            yield path / func.path, content
+        elif isinstance(content, Iterable) and not isinstance(content, Mapping):
+            try:
+                for params, page_content in content:
+                    yield path / func.route.fill(params), page_content
+            except RenderError:
+                raise
+            except Exception as e:
+                raise RenderError(f"{func.name}: {type(e).__name__}: {e}") from e
+        else:
+            for params in content:
+                filled_path = func.route.fill(params)
+                yield path / filled_path, content[params]
+
+    def _render_pages(self, path, funcs, executor=None, previous=None):
+        """Render page functions to the given path.
+
+        If an executor is given, page functions are evaluated in it,
+        and then each file they create is written in it. Files are
+        collected in registration order before they are written, so if
+        two pages create the same file, the last one registered wins, just
+        as it would when rendering serially, and the file is only written
+        once.
+
+        :param path: The path to write to.
+        :param funcs: The page functions to render.
+        :param executor: A `concurrent.futures.Executor`, or None to
+                         render in the current thread.
+        :param previous: If given, a dict of the digests of files already
+                         at path. Only files whose content changed are
+                         written. Files not in it are compared with what
+                         is on disk.
+
+        :returns: a dict of each page function to a dict of the files it
+                  created and the digests of their content.
+        """
+        only_changed = previous is not None
+        previous = previous or {}
+        outputs = {func: {} for func in funcs}
+        if executor is None:
+            for func in funcs:
+                content, _, _ = _evaluate_page(func)
+                for render_path, page_content in self._page_files(path, func, content):
+                    outputs[func][render_path] = self._render_file(
+                        render_path, page_content, only_changed, previous.get(render_path)
+                    )
+            return outputs
+
+        # generator functions are evaluated here, so that the writes of
+        # their entries can be fanned out as they are made. Other page
+        # functions that return an iterator are streamed the same way,
+        # once they have been evaluated, unless the executor may run them
+        # in another process, which has to make their entries itself (see
+        # _evaluate_page).
+        order = {func: index for index, func in enumerate(funcs)}
+        in_threads = isinstance(executor, ThreadPoolExecutor)
+        streams = {func: None for func in funcs if func.streams}
+        evaluations = [
+            (func, executor.submit(
+                _evaluate_page, func, self._evaluation.id, not in_threads
+            ))
+            for func in funcs if not func.streams
+        ]
+        files = {}
+        for func, evaluation in evaluations:
+            content, dependencies, timings = evaluation.result()
+            # a process pool evaluates the page in another process, so
+            # its result has to be memoised here as well.
+            self._evaluation.record(func, content, dependencies, timings)
+            if in_threads and isinstance(content, Iterator):
+                streams[func] = content
+                continue
+            for render_path, page_content in self._page_files(path, func, content):
+                files[render_path] = func, page_content
+
+        for func in sorted(streams, key=order.get):
+            content = streams[func]
+            if content is None:
+                content, _, _ = _evaluate_page(func)
+            pending = deque()
+            for render_path, page_content in self._page_files(path, func, content):
+                if render_path in files:
+                    # a page registered later creates the same file.
+                    if order[files[render_path][0]] > order[func]:
+                        continue
+                    del files[render_path]
+                for pending_path, write in pending:
+                    # two writes of the same file can't run at once.
+                    if pending_path == render_path:
+                        write.result()
+                pending.append((render_path, executor.submit(
+                    _write_file, render_path, page_content,
+                    only_changed, previous.get(render_path), self.compression
+                )))
+                # limit how many entries are held in memory at once.
+                if len(pending) > MAX_PENDING_WRITES:
+                    render_path, write = pending.popleft()
+                    outputs[func][render_path] = write.result()
+            for render_path, write in pending:
+                outputs[func][render_path] = write.result()
+
+        writes = [
+            (func, render_path, executor.submit(
+                _write_file, render_path, page_content,
+                only_changed, previous.get(render_path), self.compression
+            ))
+            for render_path, (func, page_content) in files.items()
+        ]
+        for func, render_path, write in writes:
+            outputs[func][render_path] = write.result()
+        return outputs
+
+    def render(self, path='./dist/', workers=None, executor=None, incremental=False,
+               clean=True, atomic=False, generations=2, profile=False, fresh=True):
         """Write the site to a path.
 
         :param path: The path to write to.
+        :param workers: If given, the number of threads to evaluate
+                        page functions and write files with.
+        :param executor: A `concurrent.futures.Executor` to evaluate
+                         page functions and write files with. To use a
+                         `ProcessPoolExecutor`, page functions must be
+                         defined at the top level of a module, so they
+                         can be pickled.
+        :param incremental: If True, keep the site previously rendered to
+                            path, and only evaluate page functions whose
+                            code, templates, data or static files changed
+                            since then. What each page read is stored in
+                            a manifest next to path. Implies clean=False.
+        :param clean: If True, delete everything at path before rendering.
+                      If False, keep the site previously rendered to
+                      path, only write files whose content changed (so
+                      unchanged files keep their mtime), and delete files
+                      that are no longer part of the site.
+        :param atomic: If True, render the site into a new directory next
+                       to path (see `dewar.generations`), and then switch
+                       path, a symlink, over to it in one step. Anything
+                       serving path sees the whole old site until then,
+                       and if rendering fails path is left untouched.
+                       Backups aren't made, as the old generations are
+                       kept instead.
+        :param generations: How many previous generations to keep when
+                            atomic is True; see `rollback`.
+        :param profile: If True, record how long each page function took
+                        to evaluate (and how much of that was spent
+                        rendering templates and loading data), and how
+                        many files and bytes it made. Sites with profile
+                        hooks (see `profile_hook`) are always profiled.
+        :param fresh: If True, evaluate every page function again, even
+                      if it was evaluated by an earlier render (or
+                      `render_path`). If False, reuse what page functions
+                      returned before, unless they were invalidated (see
+                      `invalidate`), such as to quickly render a site
+                      again after a few of its files changed.
+
+        :returns: a `dewar.profiling.BuildProfile` if the render was
+                  profiled, or None.
         """
+        start = time.perf_counter()
+        if fresh:
+            self._evaluation = Evaluation()
         path = Path(path)
-        render_functions = self.registered_functions
-        if self.create_backups:
-            shutil.make_archive(path / '..' / 'old' / f'site_{time.time()}', 'zip', path)
-        shutil.rmtree(path)
-        self._render_static(path)
-        for func in render_functions:
-            content = func()
-            if isinstance(content, str):
-                render_path = path / func.path
-                self._render_file(render_path, content)
-            else:
-                for params in content:
-                    filled_path = fill_path(func.path, params)
-                    render_path = path / filled_path
-                    self._render_file(render_path, content[params])
+        if atomic:
+            root = new_generation(path, seed=incremental or not clean)
+        else:
+            root = path
+            # a site rendered atomically before is rendered to a
+            # directory again.
+            deactivate(path, seed=incremental or not clean)
+            if self.create_backups and path.exists():
+                make_backup(path, self.backup_method)
+                prune_backups(path, self.keep_backups, self.max_backup_size)
+
+        try:
+            outputs = self._render_to(
+                root, manifest_path(path), workers, executor, incremental, clean
+            )
+        except BaseException:
+            if atomic:
+                shutil.rmtree(root)
+            raise
+
+        if atomic:
+            activate(path, root)
+            prune_generations(path, generations)
+
+        if profile or self.profile_hooks:
+            return self._profile(outputs, time.perf_counter() - start)
+        return None
+
+    def profile_hook(self, func):
+        """A decorator that registers a function to be called with the
+        `dewar.profiling.PageProfile` of each page function a render
+        evaluates, such as to send it to a monitoring service. Renders of
+        a site with hooks are always profiled.
+
+        :param func: a function that takes a `PageProfile`.
+        """
+        self.profile_hooks.append(func)
+        return func
+
+    def _profile(self, outputs, elapsed):
+        """Return the profile of a render, and pass the profile of each
+        page function to the site's profile hooks.
+
+        :param outputs: What `_render_pages` returned.
+        :param elapsed: How many seconds the whole render took.
+
+        :rtype: dewar.profiling.BuildProfile
+        """
+        pages = []
+        for func, files in outputs.items():
+            state = self._evaluation.get(func)
+            timings = state.timings if state is not None and state.timings else {}
+            pages.append(PageProfile(
+                name=func.name,
+                time=timings.get('time', 0.0),
+                template_time=timings.get('template', 0.0),
+                data_time=timings.get('data', 0.0),
+                files=len(files),
+                bytes=sum(render_path.stat().st_size for render_path in files),
+            ))
+        for page in pages:
+            for hook in self.profile_hooks:
+                hook(page)
+        return BuildProfile(pages, elapsed)
+
+    def rollback(self, path='./dist/', steps=1):
+        """Switch a site rendered with `render(atomic=True)` back to an
+        older generation.
+
+        :param path: The path the site was rendered to.
+        :param steps: How many generations to go back.
+
+        :returns: the path of the generation now in use.
+        """
+        return rollback(path, steps)
+
+    def _render_to(self, path, manifest_file, workers, executor, incremental, clean):
+        """Write the site to a path. See `render` for the arguments.
+
+        :param manifest_file: Where the manifest is kept.
+
+        :returns: what `_render_pages` returned.
+        """
+        funcs = list(self.registered_functions)
+        manifest = None
+        if incremental or not clean:
+            manifest = Manifest.load(manifest_file)
+            if incremental:
+                funcs = manifest.outdated(funcs, path)
+        else:
+            if path.exists() and any(path.iterdir()):
+                shutil.rmtree(path)
+            # an old manifest would no longer describe what is at path.
+            manifest_file.unlink(missing_ok=True)
+        previous = manifest.digests(path) if manifest is not None else None
+        if executor is None and workers:
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                static_files = self._render_static(path, pool)
+                outputs = self._render_pages(path, funcs, pool, previous)
+        else:
+            static_files = self._render_static(path, executor)
+            outputs = self._render_pages(path, funcs, executor, previous)
+
+        if manifest is not None:
+            self._update_manifest(manifest, path, outputs)
+            keep = static_files | manifest.all_files()
+            _prune(path, keep | self._compressed_names(keep))
+        return outputs
 
+    def _update_manifest(self, manifest, path, outputs):
+        """Record a build in the manifest.
+
+        :param manifest: The manifest of the previous build.
+        :param path: The path the site was rendered to.
+        :param outputs: What `_render_pages` returned.
+        """
+        names = {func.name for func in self.registered_functions}
+        for name in list(manifest.pages):
+            if name not in names:
+                manifest.remove(name)
+
+        for func, files in outputs.items():
+            files = {
+                render_path.relative_to(path).as_posix(): digest
+                for render_path, digest in files.items()
+            }
+            state = self._evaluation.get(func)
+            manifest.update(func, files, state.dependencies if state is not None else set())
+        manifest.save()
+
+
+def _stream_page(func, entries, context, timings, validate):
+    """Yield the (params, content) pairs of a page function that returned
+    an iterator, so that they can be rendered as they are made.
+
+    Each pair is made in the context the page function was called in, so
+    the current page (and the dependencies it records) are the same as
+    if it had made them all before returning.
+
+    :param func: the page function.
+    :param entries: the iterator it returned.
+    :param context: a `contextvars.Context` to make each pair in.
+    :param timings: the page's timings, to add the time each pair took to.
+    :param validate: whether to validate each pair.
+    """
+    while True:
+        start = time.perf_counter()
+        try:
+            entry = context.run(next, entries)
+        except StopIteration:
+            return
+        finally:
+            timings['time'] += time.perf_counter() - start
+        if validate:
+            validate_entry(func, entry)
+        yield entry
+
+
+def _entry_content(func, content, path, params):
+    """Given what a page function returned, return the content of the
+    file it creates at path, or None if it doesn't create it.
+
+    :param func: the page function.
+    :param content: what it returned.
+    :param path: the path of a file matched by its route.
+    :param params: the values of the variables in path.
+    """
+    if isinstance(content, (str, StreamedTemplate)):
+        return content
+    if isinstance(content, dict):
+        for key in (params, params[0] if len(params) == 1 else None):
+            if key in content:
+                return content[key]
+        entries = content.items()
+    else:
+        entries = content
+    try:
+        for entry_params, entry_content in entries:
+            if func.route.fill(entry_params) == path:
+                return entry_content
+    except RenderError:
+        raise
+    except Exception as e:
+        raise RenderError(f"{func.name}: {type(e).__name__}: {e}") from e
+    return None
+
+
+def _evaluate_page(func, evaluation_id=None, collect=False):
+    """Call a page function, raising a RenderError that names the page
+    if it fails.
+
+    :param func: The page function to call.
+    :param evaluation_id: The id of the `dewar.evaluation.Evaluation` of
+                          the render. If the page function's site has a
+                          different evaluation (as it does in a worker of
+                          a process pool, the first time it is sent a
+                          page in a render), it starts a new one.
+    :param collect: Whether to make every entry of a page function that
+                    returns an iterator, and return them in a list
+                    iterator, so they can be sent back from a process
+                    pool.
+    :returns: a tuple of whatever the page function returned, the
+              dependencies recorded while evaluating it, and its timings.
+    """
+    site = func._registered_to
+    if evaluation_id is not None and site._evaluation.id != evaluation_id:
+        site._evaluation = Evaluation(evaluation_id)
+    try:
+        content, state = func._evaluate()
+        if collect and isinstance(content, Iterator):
+            # an iterator can't be sent back from a process pool, so its
+            # entries are made here.
+            content = iter(list(content))
+        return content, state.dependencies, state.timings
+    except RenderError:
+        raise
+    except Exception as e:
+        raise RenderError(f"{func.name}: {type(e).__name__}: {e}") from e
+
+
+def _write_file(path, content, only_changed=False, previous_digest=None, compression=None):
+    """Write content to a path, creating any missing parent directories.
+
+    The content is written to a temporary file which then replaces the
+    file at path, so the file at path is never partially written.
+
+    :param path: a path to write to.
+    :param content: content to be written to that path: a string, or an
+                    iterable of strings (such as a StreamedTemplate),
+                    which is written in chunks as it is iterated over.
+    :param only_changed: if True, and the file at path already has this
+                         content, don't write it.
+    :param previous_digest: the digest of the file at path, if known.
+                            Otherwise, it is read from disk.
+    :param compression: if given, a `dewar.compression.Compression` to
+                        write compressed copies of the content with. They
+                        are only written again if the content changed.
+
+    :returns: the digest of the content.
+    """
+    if not isinstance(content, str):
+        return _write_stream(path, content, only_changed, previous_digest, compression)
+
+    data = content.encode('utf-8')
+    digest = content_digest(data)
+    if only_changed and path.is_file():
+        if previous_digest is None and path.stat().st_size == len(data):
+            previous_digest = file_digest(path)
+        if previous_digest == digest and (compression is None or compression.is_current(path)):
+            return digest
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    temp_path = path.with_name(f'.{path.name}.tmp')
+    temp_path.write_bytes(data)
+    os.replace(temp_path, path)
+    if compression is not None:
+        compression.write(path, data)
+    return digest
+
+
+def _write_stream(path, chunks, only_changed=False, previous_digest=None, compression=None):
+    """Write an iterable of strings to a path, chunk by chunk, so that
+    its content is never held in memory in full. Each chunk is also
+    compressed as it is written. See `_write_file`.
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    temp_path = path.with_name(f'.{path.name}.tmp')
+    digest = hashlib.sha256()
+    compressed = compression.stream(path) if compression is not None else None
+    try:
+        with open(temp_path, 'wb', buffering=WRITE_BUFFER_SIZE) as render_file:
+            for chunk in chunks:
+                data = chunk.encode('utf-8')
+                digest.update(data)
+                render_file.write(data)
+                if compressed is not None:
+                    compressed.update(data)
+    except BaseException:
+        temp_path.unlink(missing_ok=True)
+        if compressed is not None:
+            compressed.discard()
+        raise
+    digest = digest.hexdigest()
+
+    if only_changed and path.is_file():
+        if previous_digest is None:
+            previous_digest = file_digest(path)
+        if previous_digest == digest and (compression is None or compression.is_current(path)):
+            temp_path.unlink()
+            if compressed is not None:
+                compressed.discard()
+            return digest
+    os.replace(temp_path, path)
+    if compressed is not None:
+        compressed.commit()
+    return digest
+
+
+def _prune(path, keep):
+    """Delete every file under path that isn't in keep, and then any
+    empty directories.
+
+    :param path: the path a site was rendered to.
+    :param keep: a set of files to keep, relative to path, in posix form.
+    """
+    for directory, _, files in os.walk(path, topdown=False):
+        directory = Path(directory)
+        for name in files:
+            file_path = directory / name
+            if file_path.relative_to(path).as_posix() not in keep:
+                file_path.unlink()
+        if directory != path and not any(directory.iterdir()):
+            directory.rmdir()
@@ -0,0 +1,185 @@
+"""What page functions returned while a site was being rendered.
+
+A page function is only evaluated once per render, however many times
+it is called: other page functions can call it to get its content,
+cheaply. This is remembered in an `Evaluation`, rather than on the page
+function itself, so each render can start a new one, and a page
+function can be evaluated again after it is invalidated.
+"""
+from collections.abc import Iterator
+
+import threading
+import uuid
+
+
+class PageState:
+    """The state of a page function within an evaluation.
+
+    :ivar owner: the id of the thread evaluating the page function, or
+                 None. Other threads that call it wait for its result,
+                 and calling it from within itself can be caught.
+    :ivar done: whether the page function returned, and `returned` is
+                what it returned.
+    :ivar dependencies: what the page function read, as recorded by
+                        `dewar.tracking.track_dependencies`.
+    :ivar timings: how long it took, as recorded by
+                   `dewar.profiling.track_timings`.
+    """
+
+    __slots__ = ('owner', 'done', 'returned', 'dependencies', 'timings')
+
+    def __init__(self):
+        self.owner = None
+        self.done = False
+        self.returned = None
+        self.dependencies = None
+        self.timings = None
+
+    def store(self, returned, dependencies, timings):
+        "Record what the page function returned."
+        self.returned = returned
+        self.dependencies = dependencies
+        self.timings = timings
+        self.done = True
+
+
+class Evaluation:
+    """The states of the page functions of a site, for one render.
+
+    :param id: a unique id for the evaluation. An evaluation is copied to
+               a process pool's workers by its id, so each worker can
+               tell when it needs to start a new evaluation of its own.
+    """
+
+    def __init__(self, id=None):
+        self.id = id or uuid.uuid4().hex
+        self._pages = {}
+        # the state each thread is waiting for, keyed by the thread's id.
+        self._waiting = {}
+        self._lock = threading.Condition()
+
+    def page(self, func):
+        """Return the state of a page function, creating it if it hasn't
+        been called yet.
+
+        :param func: a page function.
+
+        :rtype: PageState
+        """
+        with self._lock:
+            return self._page(func)
+
+    def _page(self, func):
+        state = self._pages.get(func.name)
+        if state is None:
+            state = self._pages[func.name] = PageState()
+        return state
+
+    def claim(self, func):
+        """Return the state of a page function, for the current thread to
+        evaluate it.
+
+        If another thread is evaluating the page function, this waits
+        until it is done. If the page function hasn't returned, the
+        current thread becomes its owner, and must call `release` once it
+        has evaluated it.
+
+        :param func: a page function.
+
+        :rtype: PageState
+
+        :raises RuntimeError: if the page function calls itself, either
+                              directly, or through other page functions
+                              (which may be being evaluated by other
+                              threads).
+        """
+        thread = threading.get_ident()
+        with self._lock:
+            state = self._page(func)
+            while state.owner is not None:
+                if self._waits_for(state, thread):
+                    raise RuntimeError("Calling functions within themselves not allowed!")
+                self._waiting[thread] = state
+                try:
+                    self._lock.wait()
+                finally:
+                    del self._waiting[thread]
+            if not state.done:
+                state.owner = thread
+            return state
+
+    def record(self, func, returned, dependencies, timings):
+        """Record what a page function returned when it was evaluated
+        somewhere else, such as in a worker of a process pool, unless it
+        has been evaluated here too.
+
+        An iterator can only be consumed once, so it isn't memoised, but
+        what the page function read is still recorded.
+        """
+        with self._lock:
+            state = self._page(func)
+            if state.done or state.owner is not None:
+                return
+            if isinstance(returned, Iterator):
+                state.dependencies = dependencies
+                state.timings = timings
+            else:
+                state.store(returned, dependencies, timings)
+
+    def release(self, state):
+        """Finish evaluating a page function claimed with `claim`, and
+        wake any threads waiting for it.
+
+        :param state: what `claim` returned.
+        :type state: PageState
+        """
+        with self._lock:
+            state.owner = None
+            self._lock.notify_all()
+
+    def _waits_for(self, state, thread):
+        """Return whether the owner of state is the given thread, or is
+        waiting for it, perhaps through other threads.
+        """
+        owner = state.owner
+        while owner is not None:
+            if owner == thread:
+                return True
+            waiting = self._waiting.get(owner)
+            owner = waiting.owner if waiting is not None else None
+        return False
+
+    def get(self, func):
+        """Return the state of a page function, or None if it hasn't been
+        called yet in this evaluation.
+
+        :rtype: PageState
+        """
+        return self._pages.get(func.name)
+
+    def evaluated(self):
+        """Return the names of the page functions that have been
+        evaluated, and the states they were left in.
+
+        :rtype: dict
+        """
+        with self._lock:
+            return {
+                name: state for name, state in self._pages.items()
+                if state.dependencies is not None
+            }
+
+    def invalidate(self, names=None):
+        """Forget the states of page functions, so they are evaluated
+        again the next time they are called. A page function that is
+        being evaluated finishes, but what it returns is forgotten.
+
+        :param names: the names of the page functions to forget, or None
+                      to forget them all.
+        :type names: list
+        """
+        with self._lock:
+            if names is None:
+                self._pages.clear()
+            for name in names or ():
+                self._pages.pop(name, None)
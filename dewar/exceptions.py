@@ -1,2 +1,6 @@
 class ValidationError(TypeError):
     pass
+
+
+class RenderError(RuntimeError):
+    pass
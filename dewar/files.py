@@ -0,0 +1,165 @@
+"""Functions for copying and linking files and directory trees.
+
+Rendered files are always replaced, rather than written over, so a
+file can be safely hardlinked into a backup or another generation of a
+site: changing it in one place never changes it in the other.
+"""
+from pathlib import Path
+
+import os
+import shutil
+
+
+def link_tree(src, dst):
+    """Recreate the directory tree at src at dst, with every file a
+    hardlink to the file in src. This takes no space for the files'
+    content, and little time.
+
+    :param src: the directory to link from.
+    :type src: pathlib.Path
+
+    :param dst: the directory to create. It may already exist.
+    :type dst: pathlib.Path
+    """
+    src = Path(src)
+    dst = Path(dst)
+    for parent, _, files in os.walk(src):
+        target = dst / Path(parent).relative_to(src)
+        target.mkdir(parents=True, exist_ok=True)
+        for name in files:
+            os.link(Path(parent) / name, target / name)
+
+
+def tree_size(paths):
+    """Return the number of bytes used by files and directories,
+    counting each file once even if it is hardlinked in more than one.
+
+    :param paths: files and directories.
+    :type paths: list
+
+    :rtype: int
+    """
+    seen = set()
+    total = 0
+    for path in paths:
+        path = Path(path)
+        files = [path] if path.is_file() else (p for p in path.rglob('*') if p.is_file())
+        for file_path in files:
+            stat = file_path.stat()
+            if (stat.st_dev, stat.st_ino) not in seen:
+                seen.add((stat.st_dev, stat.st_ino))
+                total += stat.st_size
+    return total
+
+
+# the ioctl that asks Linux to clone a file's extents (a reflink).
+FICLONE = 0x40049409
+
+COPY_METHODS = ('copy', 'reflink', 'hardlink')
+
+
+def _reflink(src, dst):
+    "Clone src to dst, sharing their data until either is changed."
+    import fcntl
+
+    with open(src, 'rb') as src_file, open(dst, 'wb') as dst_file:
+        fcntl.ioctl(dst_file.fileno(), FICLONE, src_file.fileno())
+    shutil.copystat(src, dst)
+
+
+def _put_file(src, dst, method):
+    """Put a copy of src at dst using method, replacing any file there.
+    Falls back to a copy if the filesystem can't reflink or hardlink.
+    """
+    temp_path = dst.with_name(f'.{dst.name}.tmp')
+    temp_path.unlink(missing_ok=True)
+    try:
+        if method == 'hardlink':
+            os.link(src, temp_path)
+        elif method == 'reflink':
+            _reflink(src, temp_path)
+        else:
+            # copy2 uses the kernel's zero-copy functions (such as
+            # sendfile) where the platform has them.
+            shutil.copy2(src, temp_path)
+    except (OSError, ImportError):
+        temp_path.unlink(missing_ok=True)
+        shutil.copy2(src, temp_path)
+    os.replace(temp_path, dst)
+
+
+def _is_synced(src_stat, dst):
+    "Return whether the file at dst is already the same as one with src_stat."
+    try:
+        dst_stat = dst.stat()
+    except FileNotFoundError:
+        return False
+    if (dst_stat.st_dev, dst_stat.st_ino) == (src_stat.st_dev, src_stat.st_ino):
+        return True
+    return (dst_stat.st_size, dst_stat.st_mtime_ns) == (src_stat.st_size, src_stat.st_mtime_ns)
+
+
+def sync_tree(src, dst, method='copy', delete=True, names=None, keep=None):
+    """Make the directory tree at dst the same as the one at src, only
+    copying files whose size or modification time differ. Symlinks in
+    src are followed, so dst has copies of the files they point to.
+
+    :param src: the directory to copy from.
+    :type src: pathlib.Path
+
+    :param dst: the directory to copy to. It may already exist.
+    :type dst: pathlib.Path
+
+    :param method: how to copy files: 'copy', 'reflink' (which shares
+                   the files' data until one of them changes, on
+                   filesystems that support it), or 'hardlink' (which
+                   makes the file in dst the same file as the one in
+                   src, so changing one changes the other). If the
+                   filesystem can't reflink or hardlink, files are copied.
+    :type method: str
+
+    :param delete: whether to delete files in dst that aren't in src.
+    :type delete: bool
+
+    :param names: if given, a dict of the paths of files in src to the
+                  paths to copy them to in dst (both relative, in posix
+                  form). Files not in it keep their path.
+    :type names: dict
+
+    :param keep: if given, a set of files in dst (relative, in posix
+                 form) not to delete, even though they aren't in src.
+    :type keep: set
+
+    :returns: the files in dst that came from src, relative to dst.
+    :rtype: set
+    """
+    if method not in COPY_METHODS:
+        raise ValueError(f"Copy method must be one of {COPY_METHODS}, not '{method}'.")
+    src = Path(src)
+    dst = Path(dst)
+    synced = set()
+    names = names or {}
+    # symlinked directories are copied like any other, as copytree does.
+    for parent, _, files in os.walk(src, followlinks=True):
+        relative = Path(parent).relative_to(src)
+        (dst / relative).mkdir(parents=True, exist_ok=True)
+        for name in files:
+            src_file = Path(parent) / name
+            dst_name = (relative / name).as_posix()
+            dst_name = names.get(dst_name, dst_name)
+            dst_file = dst / dst_name
+            if not _is_synced(src_file.stat(), dst_file):
+                dst_file.parent.mkdir(parents=True, exist_ok=True)
+                _put_file(src_file, dst_file, method)
+            synced.add(dst_name)
+
+    if delete:
+        keep = synced | (keep or set())
+        for parent, _, files in os.walk(dst, topdown=False):
+            parent = Path(parent)
+            for name in files:
+                if (parent / name).relative_to(dst).as_posix() not in keep:
+                    (parent / name).unlink()
+            if parent != dst and not any(parent.iterdir()):
+                parent.rmdir()
+    return synced
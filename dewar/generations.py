@@ -0,0 +1,172 @@
+"""Atomic output: a site is rendered into a new directory (a generation),
+and the path it is served from is a symlink that is then switched to it.
+
+For a site rendered to `dist/`, the generations are kept in
+`dist.generations/`, and `dist` is a symlink to the current one. Older
+generations are kept so that the site can be rolled back instantly.
+"""
+from pathlib import Path
+
+import os
+import shutil
+import time
+
+from dewar.files import link_tree
+
+
+def generations_path(path):
+    """Return the directory the generations of a site rendered to path
+    are kept in.
+
+    :param path: the path the site is rendered to.
+    :type path: pathlib.Path
+    """
+    path = Path(path).absolute()
+    return path.with_name(path.name + '.generations')
+
+
+def list_generations(path):
+    """Return the generations of a site, oldest first.
+
+    :param path: the path the site is rendered to.
+    :type path: pathlib.Path
+
+    :rtype: list
+    """
+    directory = generations_path(path)
+    if not directory.is_dir():
+        return []
+    directory = directory.resolve()
+    return sorted(p for p in directory.iterdir() if p.is_dir() and not p.is_symlink())
+
+
+def current_generation(path):
+    """Return the generation path currently points to, or None.
+
+    :param path: the path the site is rendered to.
+    :type path: pathlib.Path
+    """
+    path = Path(path)
+    if not path.is_symlink():
+        return None
+    return path.resolve()
+
+
+def new_generation(path, seed=False):
+    """Create a directory for a new generation of a site.
+
+    :param path: the path the site is rendered to.
+    :type path: pathlib.Path
+
+    :param seed: if True, start the new generation with hardlinks to the
+                 files of the current one (or of the directory at path),
+                 so only files that change need to be written. Files must
+                 then be replaced (not written in place) when they change,
+                 so the old generation is left as it was.
+    :type seed: bool
+
+    :rtype: pathlib.Path
+    """
+    directory = generations_path(path)
+    directory.mkdir(parents=True, exist_ok=True)
+    generation = directory / f'{time.time_ns()}'
+    generation.mkdir()
+
+    path = Path(path)
+    if seed and path.is_dir():
+        link_tree(path.resolve(), generation)
+    return generation
+
+
+def activate(path, generation):
+    """Make path point to a generation.
+
+    If path is a symlink, it is replaced atomically, so anything serving
+    the site sees either the old generation or the new one. If path is
+    a directory (rendered without generations), it is first moved into
+    the generations directory, which is not atomic.
+
+    :param path: the path the site is rendered to.
+    :type path: pathlib.Path
+
+    :param generation: the generation to make current.
+    :type generation: pathlib.Path
+    """
+    path = Path(path).absolute()
+    generation = Path(generation)
+    if path.is_dir() and not path.is_symlink():
+        # named to sort just before the generation replacing it.
+        os.rename(path, generation.with_name(f'{int(generation.name) - 1}'))
+
+    temp_link = path.with_name(f'.{path.name}.link')
+    if temp_link.is_symlink():
+        temp_link.unlink()
+    os.symlink(os.path.relpath(generation, path.parent), temp_link)
+    os.replace(temp_link, path)
+
+
+def deactivate(path, seed=False):
+    """Make path a directory again, if it is a symlink to a generation,
+    so a site can be rendered to it without generations. The generations
+    are left as they are.
+
+    :param path: the path the site is rendered to.
+    :type path: pathlib.Path
+
+    :param seed: if True, fill the directory with hardlinks to the files
+                 of the current generation, so a render that keeps the
+                 site already at path can reuse them.
+    :type seed: bool
+    """
+    path = Path(path).absolute()
+    if not path.is_symlink():
+        return
+    temp_directory = path.with_name(f'.{path.name}.directory')
+    if temp_directory.exists():
+        shutil.rmtree(temp_directory)
+    temp_directory.mkdir()
+    if seed and path.is_dir():
+        link_tree(path.resolve(), temp_directory)
+    # a directory can't replace a symlink in one step, so this is not
+    # atomic.
+    path.unlink()
+    os.rename(temp_directory, path)
+
+
+def prune_generations(path, keep):
+    """Delete all but the newest generations of a site, always keeping the
+    current one.
+
+    :param path: the path the site is rendered to.
+    :type path: pathlib.Path
+
+    :param keep: how many generations to keep, besides the current one.
+    :type keep: int
+    """
+    current = current_generation(path)
+    older = [g for g in list_generations(path) if g != current]
+    for generation in older[:max(len(older) - keep, 0)]:
+        shutil.rmtree(generation)
+
+
+def rollback(path, steps=1):
+    """Make path point to an older generation.
+
+    :param path: the path the site is rendered to.
+    :type path: pathlib.Path
+
+    :param steps: how many generations to go back.
+    :type steps: int
+
+    :returns: the generation that is now current.
+    :rtype: pathlib.Path
+    """
+    generations = list_generations(path)
+    current = current_generation(path)
+    if current not in generations:
+        raise RuntimeError(f"{path} is not pointing to a generation.")
+    index = generations.index(current) - steps
+    if index < 0:
+        raise RuntimeError(f"{path} does not have {steps} older generations.")
+    activate(path, generations[index])
+    return generations[index]
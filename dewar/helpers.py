@@ -1,14 +1,24 @@
+from collections import OrderedDict, namedtuple
 from pathlib import Path
 from os.path import relpath, join
 
 from dewar import dewar, site
-from dewar.jinja import add_jinja_global
-from dewar.parser import fill_path, parse_path
+from dewar.cache import DiskCache
+from dewar.data import DataDir, data_cache
+from dewar.jinja import StreamedTemplate, add_jinja_global
+from dewar.parser import compile_path
+from dewar.profiling import timed
+from dewar.tracking import record_dependency
 from dewar._internal import get_closest_path
+import functools
+import hashlib
 import json
+import pickle
+import threading
+import time
 import warnings
 
-from markdown import markdown
+import markdown
 
 # anything -> final return
 WRAPPER = """
@@ -37,6 +47,7 @@ def add_wrapper(content, wrapper=WRAPPER):
     return wrapper.format(content=content)
 
 
+@timed('template')
 def render_template(template, **kwargs):
     """Given a path to a template, and arguments to fill in,
     render that template.
@@ -51,51 +62,91 @@ def render_template(template, **kwargs):
     template = site._jinja_env.get_template(template)
     return template.render(**kwargs)
 
+
+def stream_template(template, **kwargs):
+    """Given a path to a template, and arguments to fill in, return
+    that template to be rendered lazily.
+
+    A page function can return this instead of the string from
+    `render_template`: the page is then written to disk in chunks as it
+    is rendered, and never held in memory in full.
+
+    :param template: a path to a jinja template (relative to the
+                     template directory.)
+    :type template: path.Pathlib, str
+
+    :param keywords: the variables to be set as the context for the jinja
+                   template.
+
+    :rtype: dewar.jinja.StreamedTemplate
+    """
+    template = site._jinja_env.get_template(template)
+    return StreamedTemplate(template, **kwargs)
+
 # load from saved directories
 
 
 DATA = 'data'
 
 
-def load_data(path):
+@timed('data')
+def load_data(path, mode='text'):
     """Load the text of a data file at a path
 
+    The file is only read from disk the first time it is loaded, and
+    again whenever it changes; see `dewar.data.DataCache`.
+
     :param path: the path of the data file, relative to the 
                  data directory of the site.
     :type path: str or pathlib.Path
 
+    :param mode: 'text' to load the file as text, 'bytes' to load it
+                 as bytes, or 'mmap' for a read-only memory map of the
+                 file, for large files only parts of which are used.
+    :type mode: str
+
     :returns: the text of the data.
-    :rtype: str
+    :rtype: str, bytes or mmap.mmap
 
     """
     data_path = dewar.site.path / DATA / Path(path)
-    if not data_path.is_file():
-        raise ValueError('The given path is not a file.')
-    return data_path.read_text()
+    record_dependency('data', data_path)
+    return data_cache.read(data_path, mode)
 
 
-def load_data_dir(path):
+@timed('data')
+def load_data_dir(path, lazy=False, mode='text'):
     """Load the text of every file in the data directory.
 
     :param path: the path of the data directory, relative to the 
                  data directory of the site.
     :type path: str or pathlib.Path
 
+    :param lazy: if True, return a `dewar.data.DataDir`, which only
+                 loads each file when it is looked up, so a page that
+                 uses a few files of a large directory only reads those
+                 (and only depends on those).
+    :type lazy: bool
+
+    :param mode: how to load each file; see `load_data`.
+    :type mode: str
+
     :returns: a dictionary of 'file_name': 'text in file' 
-    :rtype: dict
+    :rtype: dict or dewar.data.DataDir
 
     """
     data_path = dewar.site.path / DATA / Path(path)
+    record_dependency('data', data_path)
     if not data_path.is_dir():
         raise ValueError('The given path is not a directory.')
-    return {
-        str(p.relative_to(data_path)): p.read_text()
-        for p in data_path.iterdir()
-        if p.is_file()
-    }
+    data_dir = DataDir(data_path, mode)
+    if lazy:
+        return data_dir
+    return dict(data_dir)
 
 
 # interpret data
+@timed('data')
 def load_json(data):
     """Load json from text
     
@@ -120,39 +171,75 @@ def load_json_data(path):
     return load_json(load_data(path))
 
 
-def load_pymd(data):
+PymdDocument = namedtuple('PymdDocument', 'code markdown code_line has_code')
+
+
+def split_pymd(data):
+    """Split pymd text into its python code block and its markdown.
+
+    The code block starts and ends with lines that begin with '~~~'.
+
+    :param data: the text of some data
+    :type data: str
+
+    :returns: a PymdDocument of the code, the markdown, the line number
+              (in data) that the code starts on, and whether data had a
+              code block at all.
+    :rtype: PymdDocument
+    """
+    code_lines = []
+    md_lines = []
+    code_line = None
+    add_line_to_code = False
+    contains_py_block = False
+    for number, line in enumerate(data.split('\n'), 1):
+        if line.strip().startswith('~~~'):
+            contains_py_block = True
+            add_line_to_code = not code_lines
+        elif add_line_to_code:
+            if code_line is None:
+                code_line = number
+            code_lines.append(line)
+        else:
+            md_lines.append(line)
+
+    code = '\n'.join(code_lines) + '\n' if code_lines else ''
+    md = '\n'.join(md_lines) + '\n' if md_lines else ''
+    return PymdDocument(code, md, code_line or 1, contains_py_block)
+
+
+@functools.lru_cache(maxsize=256)
+def _compile_pymd(code, code_line, filename):
+    """Compile the code block of a pymd file, so that line numbers in
+    errors match the lines of the file. Cached, so loading the same
+    code again doesn't compile it again.
+    """
+    return compile('\n' * (code_line - 1) + code, filename, 'exec')
+
+
+@timed('data')
+def load_pymd(data, filename='<pymd>'):
     """Load markdown into html from text
     
     :param data: the text of some data
     :type data: str
+
+    :param filename: the name of the file data came from, used in
+                     errors raised by its code.
+    :type filename: str
     
     :returns: a tuple of a dict representing the locals defined
               in the file, and a string with html that represents
               the markdown in the file.
     :rtype: tuple(dict, str)
     """
-    pycode = ""
-    md = ""
-    add_line_to_pycode = False
-    contains_py_block = False
-    for line in data.split('\n'):
-        if line.strip().startswith('~~~'):
-            contains_py_block = True
-            if pycode:
-                add_line_to_pycode = False
-            else:
-                add_line_to_pycode = True
-        elif add_line_to_pycode:
-            pycode += line + '\n'
-        else:
-            md += line + '\n'
-    if not contains_py_block:
-        return {}, load_md(md)
+    document = split_pymd(data)
+    if not document.has_code:
+        return {}, load_md(document.markdown)
 
     exec_locals = {}
-    exec(pycode, {}, exec_locals)
-    return exec_locals, load_md(md)
-
+    exec(_compile_pymd(document.code, document.code_line, filename), {}, exec_locals)
+    return exec_locals, load_md(document.markdown)
 
 
 def load_pymd_data(path):
@@ -166,9 +253,10 @@ def load_pymd_data(path):
               the markdown in the file.
     :rtype: tuple(dict, str)
     """
-    return load_pymd(load_data(path))
+    return load_pymd(load_data(path), filename=str(path))
 
 
+@timed('data')
 def load_md(data, ignore_pymd=True):
     """Load markdown into html from text
     
@@ -183,12 +271,66 @@ def load_md(data, ignore_pymd=True):
     """
     
     if ignore_pymd:
-        return markdown(data)
+        return _convert_markdown(data)
 
     _, md = load_pymd(data)
     return md
 
 
+# The extensions (and their configs) used to render markdown. Changing
+# these invalidates any cached html.
+MARKDOWN_EXTENSIONS = []
+MARKDOWN_EXTENSION_CONFIGS = {}
+
+_markdown_local = threading.local()
+
+
+def _markdown_options():
+    "Return a string that identifies the current markdown configuration."
+    return repr((markdown.__version__, MARKDOWN_EXTENSIONS, MARKDOWN_EXTENSION_CONFIGS))
+
+
+def _get_markdown():
+    """Return this thread's Markdown instance, creating it if there isn't
+    one yet or the markdown configuration changed.
+
+    Creating a Markdown instance loads all its extensions, so it is only
+    done once per thread, rather than for every document.
+    """
+    options = _markdown_options()
+    if getattr(_markdown_local, 'options', None) != options:
+        _markdown_local.markdown = markdown.Markdown(
+            extensions=MARKDOWN_EXTENSIONS,
+            extension_configs=MARKDOWN_EXTENSION_CONFIGS,
+        )
+        _markdown_local.options = options
+    return _markdown_local.markdown
+
+
+def _convert_markdown(data):
+    """Render markdown into html, using the current site's markdown cache
+    if it has one.
+
+    :param data: the markdown to render.
+    :type data: str
+    """
+    try:
+        cache = site.markdown_cache
+    except RuntimeError:
+        cache = None
+
+    if cache is not None:
+        key = hashlib.sha256((_markdown_options() + data).encode('utf-8')).hexdigest()
+        html = cache.get(key)
+        if html is not None:
+            return html
+
+    html = _get_markdown().reset().convert(data)
+    if cache is not None:
+        cache.set(key, html)
+    return html
+
+
 def load_md_data(path):
     """Load md into html from a path
     
@@ -222,10 +364,8 @@ def rel_url_to(path, start=None):
     :rtype: str
     """
     if start is None:
-        start = get_closest_path()
-        num_path_elems = len(parse_path(start))
-
-        start = fill_path(start, [FILL_VARS_WITH]*num_path_elems)
+        route = compile_path(get_closest_path())
+        start = route.fill([FILL_VARS_WITH] * len(route.variables))
         start = Path(start).parent
 
     return relpath(path, start=start)
@@ -251,18 +391,13 @@ def url_for(function, start=None, **kwargs):
     :returns: A relative path from `start` to `path`
     :rtype: str
     """
-    path = None
     if isinstance(function, str):
-        for func in site.registered_functions:
-            if func.name == function:
-                path = func.path
-                break
-        else:
+        func = site.registered_functions.get(function)
+        if func is None:
             raise RuntimeError(f"Could not find page function named '{function}'")
-    else:
-        path = function.path
+        function = func
 
-    return rel_url_to(fill_path(path, kwargs.values()), start=start)
+    return rel_url_to(compile_path(function.path).fill(kwargs.values()), start=start)
 
 
 @add_jinja_global
@@ -270,7 +405,9 @@ def static_url(path, start=None):
     """Given a path relative to the static folder, return a path
     relative to the current function
     
-    This will raise a warning if the static file doesn't exist.
+    This will raise a warning if the static file doesn't exist. If the
+    site fingerprints its static files, the path links to the file with
+    the fingerprint in its name.
 
     :param path: the path to link to (relative to the static folder).
     :type path: pathlib.Path or str
@@ -282,15 +419,20 @@ def static_url(path, start=None):
     :returns: A relative path from `start` to `path`
     :rtype: str
     """
-    if not (site.static_path / Path(path)).is_file():
+    record_dependency('static', site.static_path / Path(path))
+    rendered_path = site.static_manifest.get(Path(path).as_posix())
+    if rendered_path is None:
         warnings.warn(Warning('Could not find the path given.'))
-    return rel_url_to(join(site.static_render_path , path), start=start)
+        rendered_path = path
+    return rel_url_to(join(site.static_render_path, rendered_path), start=start)
 
 
 kwd_mark = (object(),)
 
+CacheInfo = namedtuple('CacheInfo', 'hits misses maxsize currsize')
 
-def freeze_func(arg=None):
+
+def freeze_func(arg=None, maxsize=None, ttl=None, persist=False, version=None):
     """A decorator for a function, that causes it to return the same
     result every time it's called (given the same arguments).
 
@@ -305,25 +447,124 @@ def freeze_func(arg=None):
     1
     >>> f.num
     2
+
+    The decorated function is safe to call from several threads. If two
+    threads call it with the same arguments at once, both get the result
+    of whichever call finished first.
+
+    :param maxsize: if given, the most results to keep. When it is
+                    exceeded, the least recently used result is dropped.
+    :type maxsize: int
+
+    :param ttl: if given, how many seconds a result is kept for.
+    :type ttl: float
+
+    :param persist: whether to also keep results on disk, so that they
+                    are kept between builds. If True, they are kept in
+                    the current site's cache directory (see
+                    `Site.get_cache`); a DiskCache, or a path to a
+                    directory, can also be given. Results are keyed by
+                    the function's module and qualified name, its
+                    arguments and `version`, so they must all be
+                    picklable to be kept on disk.
+    :type persist: bool, dewar.cache.DiskCache, pathlib.Path or str
+
+    :param version: any picklable value, such as a string. Changing it
+                    means results kept on disk are no longer used.
+
+    The decorated function has a `cache_info()` method, which returns a
+    CacheInfo of the hits, misses, maxsize and current size of its cache,
+    and a `cache_clear(persistent=False)` method, which empties the
+    cache (and the results kept on disk, if persistent is True).
     """
     def decorator(func):
+        lock = threading.Lock()
+        stats = {'hits': 0, 'misses': 0}
+        qualified_name = f'{func.__module__}.{func.__qualname__}'
+
+        if persist and persist is not True and not isinstance(persist, DiskCache):
+            persist_cache = DiskCache(Path(persist) / qualified_name)
+        else:
+            persist_cache = persist
+
+        def disk_cache():
+            "Return the DiskCache this function's results are kept in."
+            if persist_cache is True:
+                return site.get_cache(f'freeze_func/{qualified_name}')
+            return persist_cache
+
+        @functools.wraps(func)
         def wrapper(*args, **kwargs):
             # key function taken from functools.lru_cache()
             key = args + kwd_mark + tuple(sorted(kwargs.items()))
 
-            if key in wrapper._returned:
-                return wrapper._returned[key]
+            with lock:
+                if key in wrapper._returned:
+                    val, expires = wrapper._returned[key]
+                    if expires is None or expires > time.monotonic():
+                        wrapper._returned.move_to_end(key)
+                        stats['hits'] += 1
+                        return val
+                    del wrapper._returned[key]
+
+            disk_key = None
+            if persist:
+                cache = disk_cache()
+                try:
+                    disk_key = hashlib.sha256(pickle.dumps(
+                        (qualified_name, version, args, sorted(kwargs.items()))
+                    )).hexdigest()
+                except (pickle.PicklingError, TypeError, AttributeError):
+                    pass
+
+            found = False
+            age = 0
+            if disk_key is not None:
+                stored = cache.get(disk_key)
+                if stored is not None:
+                    age = time.time() - stored[1]
+                    found = ttl is None or age < ttl
+                    val = stored[0]
+
+            with lock:
+                stats['hits' if found else 'misses'] += 1
+            if not found:
+                age = 0
+                val = func(*args, **kwargs)
+                if disk_key is not None:
+                    try:
+                        cache.set(disk_key, (val, time.time()))
+                    except (pickle.PicklingError, TypeError, AttributeError):
+                        pass
+
+            with lock:
+                if key in wrapper._returned:
+                    return wrapper._returned[key][0]
+                expires = None if ttl is None else time.monotonic() + ttl - age
+                wrapper._returned[key] = val, expires
+                if maxsize is not None:
+                    while len(wrapper._returned) > maxsize:
+                        wrapper._returned.popitem(last=False)
 
-            val = func(*args, **kwargs)
+            return val
 
-            wrapper._returned[key] = val
+        def cache_info():
+            with lock:
+                return CacheInfo(stats['hits'], stats['misses'], maxsize, len(wrapper._returned))
 
-            return val
-        wrapper._returned = {}
+        def cache_clear(persistent=False):
+            with lock:
+                wrapper._returned.clear()
+                stats['hits'] = stats['misses'] = 0
+            if persistent and persist:
+                disk_cache().clear()
+
+        wrapper._returned = OrderedDict()
+        wrapper.cache_info = cache_info
+        wrapper.cache_clear = cache_clear
         return wrapper
 
     # works both as @freeze_func, @freeze_func()
     if callable(arg):
         return decorator(arg)
     return decorator
-
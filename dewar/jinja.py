@@ -1,3 +1,9 @@
+import contextvars
+
+from jinja2 import Environment
+
+from dewar.tracking import record_dependency
+
 JINJA_FUNCTIONS = []
 
 def add_jinja_global(arg=None):
@@ -9,3 +15,57 @@ def add_jinja_global(arg=None):
         return decorator(arg) # return 'wrapper'
     else:
         return decorator # ... or 'decorator'
+
+
+class TrackingEnvironment(Environment):
+    """A jinja Environment that records every template it loads as a
+    dependency of the current page, including templates loaded by
+    `extends`, `include` and `import`.
+    """
+
+    def get_template(self, *args, **kwargs):
+        template = super().get_template(*args, **kwargs)
+        if template.filename:
+            record_dependency('template', template.filename)
+        return template
+
+    def select_template(self, *args, **kwargs):
+        template = super().select_template(*args, **kwargs)
+        if template.filename:
+            record_dependency('template', template.filename)
+        return template
+
+
+class StreamedTemplate:
+    """A template that is rendered lazily, in chunks, rather than into
+    one string. A page function can return one (in place of a string),
+    and it will be written to its file chunk by chunk.
+
+    It is rendered in the context it was created in, so functions like
+    `url_for` work the same as they would in the page function. It can
+    be iterated over more than once; `str()` renders it in full.
+
+    :param template: a jinja Template.
+    :param kwargs: the variables to render the template with.
+    """
+
+    def __init__(self, template, **kwargs):
+        self.template = template
+        self.kwargs = kwargs
+        self._context = contextvars.copy_context()
+
+    def __iter__(self):
+        context = self._context.copy()
+        chunks = self.template.generate(**self.kwargs)
+        while True:
+            try:
+                yield context.run(next, chunks)
+            except StopIteration:
+                return
+
+    def __str__(self):
+        return ''.join(self)
+
+    def __reduce__(self):
+        # sent between processes (by a process pool) as the rendered string.
+        return str, (str(self),)
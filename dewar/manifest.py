@@ -0,0 +1,202 @@
+"""The manifest records what each page function wrote, and what it
+read, in the last build. Incremental builds use it to skip evaluating
+page functions whose dependencies have not changed."""
+from pathlib import Path
+
+import hashlib
+import json
+
+MANIFEST_VERSION = 1
+
+# how many bytes of a file to read at a time when hashing it.
+CHUNK_SIZE = 1 << 16
+
+
+def manifest_path(path):
+    """Given the path a site is rendered to, return the path of its
+    manifest, which is kept next to it (so `dist/` has `dist.manifest.json`).
+
+    :param path: the path the site is rendered to.
+    :type path: pathlib.Path
+    """
+    path = Path(path).absolute()
+    return path.with_name(path.name + '.manifest.json')
+
+
+def content_digest(content):
+    """Return the digest of some rendered content.
+
+    :param content: the content of a file.
+    :type content: str or bytes
+    """
+    if isinstance(content, str):
+        content = content.encode('utf-8')
+    return hashlib.sha256(content).hexdigest()
+
+
+def file_digest(path):
+    """Return a digest of a file's content, or of a directory's listing.
+
+    :param path: the path to a file or directory.
+    :type path: pathlib.Path or str
+
+    :returns: a digest, or None if nothing exists at path.
+    :rtype: str
+    """
+    path = Path(path)
+    if path.is_dir():
+        listing = '\n'.join(sorted(p.name for p in path.iterdir() if p.is_file()))
+        return content_digest(listing)
+    digest = hashlib.sha256()
+    try:
+        with open(path, 'rb') as digest_file:
+            for chunk in iter(lambda: digest_file.read(CHUNK_SIZE), b''):
+                digest.update(chunk)
+    except FileNotFoundError:
+        return None
+    return digest.hexdigest()
+
+
+class Manifest:
+    """The record of a build, stored as json next to the rendered site.
+
+    :param path: where the manifest is stored.
+    :type path: pathlib.Path
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.pages = {}
+        self._digests = {}
+
+    @classmethod
+    def load(cls, path):
+        """Load a manifest from a path. If there is no manifest there,
+        or it can't be read, return an empty manifest.
+
+        :param path: where the manifest is stored.
+        :type path: pathlib.Path
+        """
+        manifest = cls(path)
+        try:
+            stored = json.loads(manifest.path.read_text())
+        except (FileNotFoundError, ValueError):
+            return manifest
+        if stored.get('version') == MANIFEST_VERSION:
+            manifest.pages = stored['pages']
+        return manifest
+
+    def save(self):
+        """Write the manifest to its path."""
+        self.path.write_text(json.dumps({
+            'version': MANIFEST_VERSION,
+            'pages': self.pages,
+        }, indent=1, sort_keys=True))
+
+    def _digest(self, target):
+        "Return the digest of a file, reading each file once per manifest."
+        if target not in self._digests:
+            self._digests[target] = file_digest(target)
+        return self._digests[target]
+
+    def files(self, name):
+        """Return the files (relative to the rendered site) that a page
+        function wrote in the last build.
+
+        :param name: the name of the page function.
+        :type name: str
+        """
+        return self.pages.get(name, {}).get('files', {})
+
+    def all_files(self):
+        """Return every file written by any page function in the manifest,
+        relative to the rendered site.
+
+        :rtype: set
+        """
+        return {f for record in self.pages.values() for f in record['files']}
+
+    def digests(self, root):
+        """Return the digest of every file written by any page function.
+
+        :param root: the path the site is rendered to.
+        :type root: pathlib.Path
+
+        :returns: a dict of each file's full path to its digest.
+        :rtype: dict
+        """
+        return {
+            root / f: digest
+            for record in self.pages.values()
+            for f, digest in record['files'].items()
+        }
+
+    def outdated(self, funcs, root):
+        """Return the page functions that need to be evaluated again.
+
+        A page is outdated if it is new, its path changed, any file it
+        wrote is missing, any file it read has changed, or it called
+        another page function that is outdated.
+
+        :param funcs: the registered page functions.
+        :param root: the path the site is rendered to.
+        :type root: pathlib.Path
+
+        :rtype: list
+        """
+        def changed(func):
+            record = self.pages.get(func.name)
+            if record is None or record['path'] != func.path:
+                return True
+            if not all((root / f).is_file() for f in record['files']):
+                return True
+            return any(
+                kind != 'page' and self._digest(target) != digest
+                for kind, target, digest in record['dependencies']
+            )
+
+        outdated = {func.name for func in funcs if changed(func)}
+        outdated.update(set(self.pages) - {func.name for func in funcs})
+
+        # a page that calls an outdated page is itself outdated.
+        found_more = True
+        while found_more:
+            found_more = False
+            for func in funcs:
+                if func.name in outdated:
+                    continue
+                called = {
+                    target for kind, target, _ in self.pages[func.name]['dependencies']
+                    if kind == 'page'
+                }
+                if called & outdated:
+                    outdated.add(func.name)
+                    found_more = True
+
+        return [func for func in funcs if func.name in outdated]
+
+    def update(self, func, files, dependencies):
+        """Record what a page function wrote and read.
+
+        :param func: the page function.
+        :param files: a dict of the path of each file it wrote (relative
+                      to the rendered site) to the digest of its content.
+        :param dependencies: a set of (kind, target) tuples, as recorded
+                             by `dewar.tracking.track_dependencies`.
+        """
+        self.pages[func.name] = {
+            'path': func.path,
+            'files': files,
+            'dependencies': sorted(
+                (kind, target, None if kind == 'page' else self._digest(target))
+                for kind, target in dependencies
+            ),
+        }
+
+    def remove(self, name):
+        """Forget a page function, returning the files it wrote.
+
+        :param name: the name of the page function.
+        :type name: str
+        """
+        return self.pages.pop(name, {}).get('files', {})
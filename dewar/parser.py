@@ -1,5 +1,118 @@
+import functools
 import re
-from collections import OrderedDict
+
+_VARIABLE_RE = re.compile(r'\<.*?\>')
+
+
+class Route:
+    """A path formatted like /<category>/<page>.html, compiled once so
+    that it can be filled in, and matched against, cheaply.
+
+    Use `compile_path` to get the route for a path, rather than creating
+    one directly, so that each path is only compiled once.
+
+    :param path: a path containing "<variables>".
+    :type path: str
+    """
+
+    def __init__(self, path):
+        if not isinstance(path, str):
+            raise TypeError("Path can't be processed - not a string.")
+        self.path = path
+
+        variables = []
+        template = ''
+        pattern = ''
+        nested_pattern = ''
+        position = 0
+        for found in _VARIABLE_RE.finditer(path):
+            literal = path[position:found.start()]
+            template += literal.replace('{', '{{').replace('}', '}}')
+            pattern += re.escape(literal)
+            nested_pattern += re.escape(literal)
+
+            name = found.group()[1:-1]
+            if name in variables:
+                index = variables.index(name)
+                pattern += f'(?:\\{index + 1})'
+                nested_pattern += f'(?:\\{index + 1})'
+            else:
+                index = len(variables)
+                variables.append(name)
+                pattern += '([^/]+)'
+                nested_pattern += '(.+)'
+            template += f'{{{index}}}'
+            position = found.end()
+        literal = path[position:]
+        template += literal.replace('{', '{{').replace('}', '}}')
+        pattern += re.escape(literal)
+        nested_pattern += re.escape(literal)
+
+        #: the names of the variables in the path, without repeats.
+        self.variables = tuple(variables)
+        #: the same for any routes that create the same files.
+        self.key = _VARIABLE_RE.sub('<>', path)
+        self._template = template
+        self._regex = re.compile(pattern)
+        self._nested_regex = re.compile(nested_pattern)
+
+    def __repr__(self):
+        return f"Route({self.path!r})"
+
+    def fill(self, params):
+        """Fill in the variables of this route.
+
+        :param params: a list of strings to fill into the path, in the
+                       order of `variables`. Any variables without a
+                       param are left as they are.
+        :type params: list, str
+
+        :rtype: str
+        """
+        if isinstance(params, str):
+            params = (params,)
+        params = tuple(params)[:len(self.variables)]
+        if len(params) < len(self.variables):
+            params += tuple(f'<{name}>' for name in self.variables[len(params):])
+        return self._template.format(*params)
+
+    def match(self, path, nested=False):
+        """Match a filled in path against this route.
+
+        A variable matches one part of a path, so it can't contain a '/',
+        unless nested is True.
+
+        :param path: a path, such as 'blog/post.html'.
+        :type path: str
+
+        :param nested: whether variables can match more than one part of
+                       the path, as a value containing a '/' fills in a
+                       path to a nested file. Then, if a path can be split
+                       more than one way, the earlier variables match as
+                       much as they can.
+        :type nested: bool
+
+        :returns: the values of the variables, or None if the path
+                  doesn't match.
+        :rtype: tuple or None
+        """
+        regex = self._nested_regex if nested else self._regex
+        found = regex.fullmatch(path)
+        if found is None:
+            return None
+        return found.groups()
+
+
+@functools.lru_cache(maxsize=1024)
+def compile_path(path):
+    """Return the `Route` for a path, compiling it only the first time.
+
+    :param path: a path containing "<variables>".
+    :type path: str
+
+    :rtype: Route
+    """
+    return Route(path)
 
 
 def parse_path(path):
@@ -9,11 +122,7 @@ def parse_path(path):
     if not isinstance(path, str):
         raise TypeError("Path can't be processed - not a string.")
 
-    path_re = r'\<.*?\>'
-    tokens = re.findall(path_re, path)
-    tokens = map(lambda x: x.replace('<', '').replace('>', ''), tokens)
-
-    return list(OrderedDict.fromkeys(tokens))
+    return list(compile_path(path).variables)
 
 
 def fill_path(path, params):
@@ -26,11 +135,4 @@ def fill_path(path, params):
     :param params: a list of strings to fill into the path.
     :rtype: list
     """
-    path_elems = parse_path(path)
-    if isinstance(params, str):
-        params = (params,)
-
-    for elem, param in zip(path_elems, params):
-        path = path.replace(f'<{elem}>', param)
-
-    return path
+    return compile_path(path).fill(params)
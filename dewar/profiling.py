@@ -0,0 +1,153 @@
+"""Records how long each page function takes to build, and how much of
+that time goes to rendering templates and loading data, so that a slow
+build can be traced back to the pages that make it slow.
+
+See `Site.render`'s `profile` argument, and `Site.profile_hook`.
+"""
+import contextvars
+import json
+import time
+from collections import namedtuple
+from contextlib import contextmanager
+
+_current_timings = contextvars.ContextVar('dewar_timings', default=None)
+
+# The kinds of work whose time is recorded separately from the rest.
+TIMING_KINDS = ('template', 'data')
+
+
+class _Timings(dict):
+    "The times recorded for a page, and the kinds being timed right now."
+    __slots__ = ('active',)
+
+    def __init__(self):
+        super().__init__(time=0.0, **{kind: 0.0 for kind in TIMING_KINDS})
+        self.active = set()
+
+
+@contextmanager
+def track_timings():
+    """A context manager that records the time spent in `timed` blocks
+    while it is active.
+
+    Like `dewar.tracking.track_dependencies`, tracking nests: a page
+    function called by another records its times into its own dict.
+
+    :returns: a dict of 'time' (filled in by the caller) and each of
+              `TIMING_KINDS` to a number of seconds.
+    :rtype: dict
+    """
+    timings = _Timings()
+    token = _current_timings.set(timings)
+    try:
+        yield timings
+    finally:
+        _current_timings.reset(token)
+
+
+@contextmanager
+def timed(kind):
+    """A context manager (or decorator) that adds the time its body takes
+    to the current page's timings.
+
+    Blocks of the same kind nested inside each other are only counted
+    once, so `load_md_data`, which loads data and then converts it, isn't
+    counted twice. Does nothing if no page is being timed.
+
+    :param kind: one of `TIMING_KINDS`.
+    :type kind: str
+    """
+    timings = _current_timings.get()
+    if timings is None or kind in timings.active:
+        yield
+        return
+    timings.active.add(kind)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[kind] += time.perf_counter() - start
+        timings.active.discard(kind)
+
+
+PageProfile = namedtuple('PageProfile', 'name time template_time data_time files bytes')
+PageProfile.__doc__ = """What building one page function took.
+
+:param name: the name of the page function.
+:param time: the seconds spent evaluating it. This includes the time
+             spent evaluating any other page functions it called.
+:param template_time: the seconds of that spent rendering templates.
+                      Templates returned from `stream_template` are
+                      rendered as they are written, so aren't counted.
+:param data_time: the seconds of that spent loading and converting data.
+:param files: the number of files it made.
+:param bytes: the size of those files.
+"""
+
+
+class BuildProfile:
+    """The profiles of the page functions evaluated by a render.
+
+    :param pages: a list of `PageProfile`.
+    :param time: the seconds the whole render took.
+    """
+
+    def __init__(self, pages, time):
+        self.pages = {page.name: page for page in pages}
+        self.time = time
+
+    def slowest(self, count=None):
+        """Return the profiles of the slowest page functions first.
+
+        :param count: how many to return, or None for all of them.
+        :type count: int
+
+        :rtype: list
+        """
+        pages = sorted(self.pages.values(), key=lambda page: page.time, reverse=True)
+        return pages[:count]
+
+    def as_dict(self):
+        "Return the profile as a dict, which can be saved as JSON."
+        return {
+            'time': self.time,
+            'pages': {name: page._asdict() for name, page in self.pages.items()},
+        }
+
+    def to_json(self, **kwargs):
+        """Return the profile as JSON.
+
+        :param kwargs: arguments to `json.dumps`.
+        """
+        return json.dumps(self.as_dict(), **kwargs)
+
+    def table(self, count=None):
+        """Return a table of the slowest page functions, as text.
+
+        :param count: how many page functions to include, or None for
+                      all of them.
+        :type count: int
+
+        :rtype: str
+        """
+        rows = [('page', 'time', 'template', 'data', 'files', 'bytes')]
+        for page in self.slowest(count):
+            rows.append((
+                page.name, f'{page.time:.4f}', f'{page.template_time:.4f}',
+                f'{page.data_time:.4f}', str(page.files), str(page.bytes),
+            ))
+        rows.append(('total', f'{self.time:.4f}', '', '', '', ''))
+        widths = [max(len(row[column]) for row in rows) for column in range(len(rows[0]))]
+        return '\n'.join(
+            '  '.join(
+                cell.ljust(width) if column == 0 else cell.rjust(width)
+                for column, (cell, width) in enumerate(zip(row, widths))
+            ).rstrip()
+            for row in rows
+        )
+
+    def __str__(self):
+        return self.table()
+
+    def __repr__(self):
+        return f'<BuildProfile of {len(self.pages)} pages in {self.time:.4f}s>'
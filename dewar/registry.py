@@ -0,0 +1,89 @@
+"""The registry of the page functions in a site."""
+from dewar.parser import compile_path
+
+
+class PageRegistry:
+    """The page functions registered to a site, kept in the order they
+    were registered, and indexed by name and by path.
+
+    Iterating over a registry gives its page functions in the order they
+    were registered.
+    """
+
+    def __init__(self):
+        self._by_name = {}
+        self._by_route = {}
+
+    def add(self, func):
+        """Add a page function to the registry.
+
+        :param func: a page function, with a `name` and `path`.
+
+        :raises ValueError: if a page function with the same name, or
+                            a path that creates the same files, is
+                            already registered.
+        """
+        if func.name in self._by_name:
+            raise ValueError(f"A page function named '{func.name}' is already registered.")
+        route_key = compile_path(func.path).key
+        if route_key in self._by_route:
+            other = self._by_route[route_key]
+            raise ValueError(
+                f"{func.name}'s path '{func.path}' is the same as {other.name}'s "
+                f"path '{other.path}'."
+            )
+        self._by_name[func.name] = func
+        self._by_route[route_key] = func
+
+    def get(self, name, default=None):
+        """Return the page function with the given name, or default.
+
+        :param name: the name of a page function.
+        :type name: str
+        """
+        return self._by_name.get(name, default)
+
+    def __getitem__(self, name):
+        return self._by_name[name]
+
+    def __contains__(self, func):
+        if isinstance(func, str):
+            return func in self._by_name
+        return self._by_name.get(getattr(func, 'name', None)) is func
+
+    def __iter__(self):
+        return iter(self._by_name.values())
+
+    def __len__(self):
+        return len(self._by_name)
+
+    def by_path(self, path):
+        """Return the page function registered with the given path
+        (such as 'pages/<page>.html'), or None.
+
+        :param path: the path a page function was registered with.
+        :type path: str
+        """
+        return self._by_route.get(compile_path(path).key)
+
+    def matches(self, path):
+        """Find the page functions that could create the file at a path,
+        relative to the rendered site.
+
+        They are found in the order a render would let them create the
+        file: when two page functions create the same file, the last one
+        registered wins, so the last registered is found first. A value
+        containing a '/' fills in a path to a nested file, so variables
+        can match more than one part of the path.
+
+        :param path: the path of a rendered file, such as 'pages/1.html'.
+        :type path: str
+
+        :returns: an iterator of tuples of a page function and the values
+                  of the variables in its path.
+        :rtype: iterator
+        """
+        for func in reversed(self._by_name.values()):
+            params = func.route.match(path, nested=True)
+            if params is not None:
+                yield func, params
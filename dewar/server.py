@@ -0,0 +1,296 @@
+"""A development server, which renders each page of a site when it is
+requested, rather than rendering the whole site to disk::
+
+    $ dewar serve --port 8000
+
+The site's `templates/`, `static/` and `data/` directories are watched
+for changes. When a file changes, only the pages that read it (and the
+pages that called those pages) are evaluated again, and any browsers
+showing the site are told to reload, over a server-sent event stream.
+
+It is meant for working on a site, not for serving it to the public.
+"""
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import unquote, urlsplit
+
+import mimetypes
+import os
+import threading
+import traceback
+
+
+# The path browsers listen to for reloads on.
+EVENTS_PATH = '/__dewar__/events'
+
+# Added to the end of each html page served, to reload it when the site
+# changes.
+RELOAD_SCRIPT = f"""<script>
+new EventSource("{EVENTS_PATH}").addEventListener("reload", function () {{
+    location.reload();
+}});
+</script>
+"""
+
+# How often to check the watched directories for changes, in seconds.
+WATCH_INTERVAL = 0.2
+
+# How often to send a comment to browsers listening for reloads, so
+# that closed connections are noticed.
+KEEPALIVE_INTERVAL = 15
+
+WATCHED_DIRECTORIES = ('templates', 'static', 'data')
+
+
+def snapshot(paths):
+    """Return the modification time and size of every file under paths.
+
+    :param paths: directories to look in. Ones that don't exist are
+                  skipped.
+    :type paths: list
+
+    :returns: a dict of each file's absolute path to its
+              (mtime_ns, size).
+    :rtype: dict
+    """
+    files = {}
+    pending = [os.path.abspath(path) for path in paths]
+    while pending:
+        try:
+            entries = os.scandir(pending.pop())
+        except (FileNotFoundError, NotADirectoryError):
+            continue
+        with entries:
+            for entry in entries:
+                if entry.is_dir():
+                    pending.append(entry.path)
+                elif entry.is_file():
+                    stat = entry.stat()
+                    files[entry.path] = (stat.st_mtime_ns, stat.st_size)
+    return files
+
+
+def changed_files(old, new):
+    """Return the files that were added, removed or changed between two
+    snapshots.
+
+    :rtype: set
+    """
+    return {path for path in old.keys() | new.keys() if old.get(path) != new.get(path)}
+
+
+class Watcher(threading.Thread):
+    """A thread that polls directories, and calls a function with the set
+    of files that changed whenever any do.
+
+    Polling only reads directory entries and stats files, so checking a
+    few thousand files several times a second is cheap.
+
+    :param paths: the directories to watch.
+    :param callback: a function that takes a set of absolute paths.
+    :param interval: how often to check for changes, in seconds.
+    """
+
+    def __init__(self, paths, callback, interval=WATCH_INTERVAL):
+        super().__init__(name='dewar-watcher', daemon=True)
+        self.paths = list(paths)
+        self.callback = callback
+        self.interval = interval
+        self._stopped = threading.Event()
+        self._snapshot = snapshot(self.paths)
+
+    def check(self):
+        """Check for changes now, calling the callback if there are any.
+
+        :returns: the files that changed.
+        :rtype: set
+        """
+        new = snapshot(self.paths)
+        changed = changed_files(self._snapshot, new)
+        self._snapshot = new
+        if changed:
+            self.callback(changed)
+        return changed
+
+    def run(self):
+        while not self._stopped.wait(self.interval):
+            self.check()
+
+    def stop(self):
+        "Stop watching."
+        self._stopped.set()
+
+
+class DevServer(ThreadingHTTPServer):
+    """An HTTP server that renders the pages of a site as they are
+    requested.
+
+    :param site: the site to serve.
+    :param address: the (host, port) to listen on.
+    :param watch: whether to watch the site's files for changes.
+    :param interval: how often to check for changes, in seconds.
+    """
+    daemon_threads = True
+
+    def __init__(self, site, address, watch=True, interval=WATCH_INTERVAL):
+        super().__init__(address, DevRequestHandler)
+        self.site = site
+        self.version = 0
+        self._changed = threading.Condition()
+        self._closing = False
+        self._static_sources = None, {}
+        self.watcher = None
+        if watch:
+            self.watcher = Watcher(
+                [site.path / name for name in WATCHED_DIRECTORIES], self.reload, interval
+            )
+            self.watcher.start()
+
+    def reload(self, changed):
+        """Forget what the pages that read the changed files returned,
+        and tell browsers to reload.
+
+        :param changed: absolute paths of files that changed.
+        :type changed: set
+        """
+        static_path = os.path.abspath(self.site.static_path)
+        if any(path.startswith(static_path + os.sep) for path in changed):
+            self.site._static_manifest = None
+        self.site.invalidate(self.site.dependencies.dependents(changed))
+        with self._changed:
+            self.version += 1
+            self._changed.notify_all()
+
+    def static_sources(self):
+        """Return a dict of the path of each rendered static file
+        (relative to `static_render_path`) to the static file it comes
+        from. The opposite of `Site.static_manifest`.
+        """
+        manifest = self.site.static_manifest
+        if self._static_sources[0] is not manifest:
+            sources = {rendered: name for name, rendered in manifest.items()}
+            self._static_sources = manifest, sources
+        return self._static_sources[1]
+
+    def wait_for_change(self, version, timeout):
+        """Wait until the site changes from version, or timeout seconds
+        pass.
+
+        :returns: the current version.
+        :rtype: int
+        """
+        with self._changed:
+            self._changed.wait_for(
+                lambda: self.version != version or self._closing, timeout
+            )
+            return self.version
+
+    def server_close(self):
+        if self.watcher is not None:
+            self.watcher.stop()
+        with self._changed:
+            self._closing = True
+            self._changed.notify_all()
+        super().server_close()
+
+
+class DevRequestHandler(BaseHTTPRequestHandler):
+    "Serves the pages and static files of a `DevServer`'s site."
+
+    server_version = 'dewar'
+
+    def do_GET(self):
+        path = unquote(urlsplit(self.path).path)
+        if path == EVENTS_PATH:
+            return self._send_events()
+        path = path.lstrip('/')
+        if path == '' or path.endswith('/'):
+            path += 'index.html'
+        if '..' in Path(path).parts:
+            return self.send_error(HTTPStatus.NOT_FOUND)
+
+        try:
+            content = self._static_file(path)
+            if content is None:
+                content = self.server.site.render_path(path)
+        except Exception:
+            body = traceback.format_exc().encode('utf-8')
+            return self._send(HTTPStatus.INTERNAL_SERVER_ERROR, body, 'text/plain; charset=utf-8')
+        if content is None:
+            return self.send_error(HTTPStatus.NOT_FOUND)
+
+        content_type = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+        if isinstance(content, str):
+            if content_type == 'text/html':
+                content = _add_reload_script(content)
+            content = content.encode('utf-8')
+            content_type += '; charset=utf-8'
+        self._send(HTTPStatus.OK, content, content_type)
+
+    def _static_file(self, path):
+        "Return the content of a static file at path, or None."
+        site = self.server.site
+        static_prefix = Path(site.static_render_path).as_posix()
+        if static_prefix != '.':
+            if not path.startswith(static_prefix + '/'):
+                return None
+            path = path[len(static_prefix) + 1:]
+        source = self.server.static_sources().get(path)
+        if source is None:
+            return None
+        return (site.static_path / source).read_bytes()
+
+    def _send(self, status, body, content_type):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('Cache-Control', 'no-store')
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_events(self):
+        "Send a reload event to the browser each time the site changes."
+        version = self.server.version
+        self.send_response(HTTPStatus.OK)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Cache-Control', 'no-store')
+        self.end_headers()
+        try:
+            while not self.server._closing:
+                new_version = self.server.wait_for_change(version, KEEPALIVE_INTERVAL)
+                if new_version != version:
+                    version = new_version
+                    self.wfile.write(f'event: reload\ndata: {version}\n\n'.encode('utf-8'))
+                else:
+                    self.wfile.write(b': keepalive\n\n')
+                self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+    def log_message(self, format, *args):
+        if not self.path.startswith(EVENTS_PATH):
+            super().log_message(format, *args)
+
+
+def _add_reload_script(html):
+    "Add the reload script to the end of the body of an html page."
+    index = html.lower().rfind('</body>')
+    if index == -1:
+        return html + RELOAD_SCRIPT
+    return html[:index] + RELOAD_SCRIPT + html[index:]
+
+
+def make_server(site, host='127.0.0.1', port=8000, watch=True, interval=WATCH_INTERVAL):
+    """Return a `DevServer` for a site, which is listening, but not yet
+    serving requests: call its `serve_forever` method to do so.
+
+    :param site: the site to serve.
+    :param host: the address to listen on.
+    :param port: the port to listen on, or 0 for any free port.
+    :param watch: whether to watch the site's files for changes.
+    :param interval: how often to check for changes, in seconds.
+
+    :rtype: DevServer
+    """
+    return DevServer(site, (host, port), watch, interval)
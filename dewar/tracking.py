@@ -0,0 +1,217 @@
+"""Records what a page function reads while it is being evaluated,
+so that a later build can tell whether the page needs to be rendered
+again, and the graph of what every page read (see `DependencyGraph`)."""
+import contextvars
+import json
+import os
+from contextlib import contextmanager
+from pathlib import Path
+
+_current_dependencies = contextvars.ContextVar('dewar_dependencies', default=None)
+
+
+@contextmanager
+def track_dependencies():
+    """A context manager that records every dependency recorded by
+    `record_dependency` while it is active.
+
+    Tracking nests: a page function called by another page function
+    records its reads into its own set, not its caller's.
+
+    :returns: a set of (kind, target) tuples, filled in as the body runs.
+    :rtype: set
+    """
+    dependencies = set()
+    token = _current_dependencies.set(dependencies)
+    try:
+        yield dependencies
+    finally:
+        _current_dependencies.reset(token)
+
+
+def record_dependency(kind, target):
+    """Record that the page currently being evaluated depends on target.
+
+    Does nothing if no page is being tracked.
+
+    :param kind: what the target is, e.g. 'template', 'data', 'static',
+                 'code' (a file of python code) or 'page' (another page
+                 function, named by target).
+    :type kind: str
+
+    :param target: an absolute path to a file, or a page function's name.
+    :type target: str or pathlib.Path
+    """
+    dependencies = _current_dependencies.get()
+    if dependencies is not None:
+        dependencies.add((kind, str(target)))
+
+
+class DependencyGraph:
+    """What each page function read the last time it was evaluated: the
+    templates it rendered (including ones they extend or include), the
+    data and static files it read, and the other page functions it
+    called.
+
+    Use `Site.dependencies` to get the graph of a site.
+
+    :param dependencies: a dict of the name of each page function to the
+                         set of (kind, target) tuples it recorded.
+    :type dependencies: dict
+
+    :param root: the directory relative paths given to `dependents` are
+                 relative to, usually the site's path.
+    :type root: pathlib.Path
+    """
+
+    def __init__(self, dependencies, root=None):
+        self.root = Path(root) if root is not None else Path.cwd()
+        self._dependencies = {}
+        self._dependents = {}
+        for name, page_dependencies in dependencies.items():
+            edges = set()
+            for kind, target in page_dependencies:
+                if kind != 'page':
+                    target = os.path.abspath(target)
+                edges.add((kind, target))
+                self._dependents.setdefault((kind == 'page', target), set()).add(name)
+            self._dependencies[name] = edges
+
+    def __contains__(self, name):
+        return name in self._dependencies
+
+    def __iter__(self):
+        return iter(self._dependencies)
+
+    def __len__(self):
+        return len(self._dependencies)
+
+    def dependencies(self, name, kinds=None):
+        """Return what a page function depends on.
+
+        :param name: the name of the page function.
+        :type name: str
+
+        :param kinds: if given, only return dependencies of these kinds,
+                      such as ('template', 'data').
+        :type kinds: tuple
+
+        :returns: a set of (kind, target) tuples, where target is an
+                  absolute path, or the name of a page function.
+        :rtype: set
+
+        :raises KeyError: if the page function hasn't been evaluated.
+        """
+        return {
+            (kind, target) for kind, target in self._dependencies[name]
+            if kinds is None or kind in kinds
+        }
+
+    def callers(self, name, transitive=False):
+        """Return the names of the page functions that called a page
+        function.
+
+        :param name: the name of the page function.
+        :type name: str
+
+        :param transitive: whether to include the callers of the callers,
+                           and so on.
+        :type transitive: bool
+
+        :rtype: set
+        """
+        return self._with_callers(self._dependents.get((True, name), set()), transitive)
+
+    def dependents(self, paths, transitive=True):
+        """Return the names of the page functions that read any of the
+        files at paths.
+
+        A page function that listed a directory (with `load_data_dir`)
+        depends on the files in it, too.
+
+        :param paths: a path, or a list of them. Relative paths are
+                      relative to the graph's root, so
+                      'data/posts/x.md' is the data file 'posts/x.md'.
+        :type paths: str, pathlib.Path or list
+
+        :param transitive: whether to include the page functions that
+                           called those page functions, and so on, as
+                           what they return would change too.
+        :type transitive: bool
+
+        :rtype: set
+        """
+        if isinstance(paths, (str, os.PathLike)):
+            paths = [paths]
+        targets = set()
+        for path in paths:
+            path = os.path.abspath(self.root / path)
+            targets.update((path, os.path.dirname(path)))
+        names = set()
+        for target in targets:
+            names |= self._dependents.get((False, target), set())
+        return self._with_callers(names, transitive)
+
+    def _with_callers(self, names, transitive):
+        "Add the callers of names, if transitive, to names."
+        names = set(names)
+        pending = list(names) if transitive else []
+        while pending:
+            for caller in self._dependents.get((True, pending.pop()), ()):
+                if caller not in names:
+                    names.add(caller)
+                    pending.append(caller)
+        return names
+
+    def as_dict(self):
+        """Return the graph as a dict of the name of each page function to
+        a dict of each kind of dependency to a sorted list of its targets,
+        which can be saved as JSON.
+        """
+        graph = {}
+        for name, edges in sorted(self._dependencies.items()):
+            kinds = graph[name] = {}
+            for kind, target in sorted(edges):
+                kinds.setdefault(kind, []).append(target)
+        return graph
+
+    def to_json(self, **kwargs):
+        """Return the graph as JSON. See `as_dict`.
+
+        :param kwargs: arguments to `json.dumps`.
+        """
+        return json.dumps(self.as_dict(), **kwargs)
+
+    def to_dot(self):
+        """Return the graph in Graphviz's DOT language, with an edge from
+        each page function to what it depends on. Page functions are
+        drawn as boxes, and files as ellipses labelled with their kind.
+
+        :rtype: str
+        """
+        lines = ['digraph dependencies {']
+        files = set()
+        for name, edges in sorted(self._dependencies.items()):
+            lines.append(f'    {_dot_id(name)} [shape=box];')
+            for kind, target in sorted(edges):
+                if kind != 'page':
+                    files.add((kind, target))
+                lines.append(f'    {_dot_id(name)} -> {_dot_id(target)};')
+        for kind, target in sorted(files):
+            label = f'{kind}: {_relative(target, self.root)}'
+            lines.append(f'    {_dot_id(target)} [label={_dot_id(label)}];')
+        lines.append('}')
+        return '\n'.join(lines)
+
+
+def _dot_id(text):
+    "Quote text as a DOT identifier."
+    return '"' + text.replace('\\', '\\\\').replace('"', '\\"') + '"'
+
+
+def _relative(path, root):
+    "Return path relative to root, if it is in root."
+    try:
+        return Path(path).relative_to(os.path.abspath(root)).as_posix()
+    except ValueError:
+        return path
@@ -1,58 +1,102 @@
-from dewar.exceptions import ValidationError
-from dewar.parser import parse_path
+from collections.abc import Iterable, Iterator, Mapping
 
+from dewar.exceptions import ValidationError
+from dewar.jinja import StreamedTemplate
+from dewar.parser import compile_path
 
-def validate_page(func):
-    """Given a page function which returned a value.
-    
-    :param val: the return from `func`.
-    :type val: str, dict
+# The default of validate_page's val, as None is a value it can be given.
+_NOT_GIVEN = object()
 
-    :param func: the function that's being used.
-    :type func: function
 
-    :return: Whether or not the return value given is valid.
-    :rtype: bool
+def _validate_keys(val, path_elements, func_name):
+    """Given the keys a page function returned (or yielded), raise a
+    ValidationError if they can't be used to fill in its path.
     """
-    def validate_dict(val, path_elements, func_name):
-        def has_correct_type(key):
-            "Return if key is of correct type"
-            return isinstance(key, tuple) or isinstance(key, str)
+    def has_correct_type(key):
+        "Return if key is of correct type"
+        return isinstance(key, tuple) or isinstance(key, str)
 
-        def is_allowed_single(key):
-            "Return, if key is string, whether it is allowed to be a string"
-            return len(path_elements) == 1 or isinstance(key, tuple)
+    def is_allowed_single(key):
+        "Return, if key is string, whether it is allowed to be a string"
+        return len(path_elements) == 1 or isinstance(key, tuple)
 
-        def is_correct_size(key):
-            "Return, if key is a tuple, whether it has the right number of parts"
-            return len(key) == len(path_elements) or isinstance(key, str)
+    def is_correct_size(key):
+        "Return, if key is a tuple, whether it has the right number of parts"
+        return len(key) == len(path_elements) or isinstance(key, str)
 
-        if not all(map(has_correct_type, val)):
-            raise ValidationError(func_name + ": Page's return did not contain keys of the right type.")
+    if not all(map(has_correct_type, val)):
+        raise ValidationError(func_name + ": Page's return did not contain keys of the right type.")
 
-        if not all(map(is_allowed_single, val)):
-            error_text = ": Page's return contained strings as keys, when it needed multiple variables."
-            raise ValidationError(func_name + error_text)
+    if not all(map(is_allowed_single, val)):
+        error_text = ": Page's return contained strings as keys, when it needed multiple variables."
+        raise ValidationError(func_name + error_text)
 
-        if not all(map(is_correct_size, val)):
-            error_text = ": Page's return contained incorrect number of variables for path."
-            raise ValidationError(func_name + error_text)
+    if not all(map(is_correct_size, val)):
+        error_text = ": Page's return contained incorrect number of variables for path."
+        raise ValidationError(func_name + error_text)
+
+    return True
+
+
+def validate_page(func, val=_NOT_GIVEN):
+    """Given a page function which returned a value.
+
+    A page function can also return an iterable of (params, content)
+    pairs, such as a list. If it is an iterator (such as a generator),
+    only its path is checked here, as its pairs are produced lazily; see
+    `validate_entry`.
+    
+    :param func: the function that's being used.
+    :type func: function
 
-        return True
+    :param val: the return from `func`. If not given, `func` is called
+                to get it.
+    :type val: str, StreamedTemplate, dict, iterable
 
+    :return: Whether or not the return value given is valid.
+    :rtype: bool
+    """
     name = func.name
     path = func.path
-    val = func()
-    path_elements = parse_path(path)
-    if type(val) is str:
+    if val is _NOT_GIVEN:
+        val = func()
+    path_elements = compile_path(path).variables
+    if type(val) is str or isinstance(val, StreamedTemplate):
         if path_elements:
             raise ValidationError(f"{name}'s path requires variables, which were not provided.")
-    elif type(val) is dict:
+    elif type(val) is dict or (isinstance(val, Iterable) and not isinstance(val, Mapping)):
         if len(path_elements) == 0:
-            error_text = "{name}'s path did not specify variables, but returned variables anyway."
+            error_text = f"{name}'s path did not specify variables, but returned variables anyway."
             raise ValidationError(error_text)
-        validate_dict(val, path_elements, name)
+        if type(val) is dict:
+            _validate_keys(val, path_elements, name)
+        elif not isinstance(val, Iterator):
+            for entry in val:
+                validate_entry(func, entry)
     else:
         raise ValidationError(f"{name} did not return a valid object to construct the page.")
 
     return True
+
+
+def validate_entry(func, entry):
+    """Given a page function that yields (or returns) (params, content)
+    pairs, check one of the pairs.
+
+    :param func: the function that's being used.
+    :type func: function
+
+    :param entry: a pair yielded by `func`.
+    :type entry: tuple
+
+    :return: Whether or not the pair given is valid.
+    :rtype: bool
+    """
+    name = func.name
+    path_elements = compile_path(func.path).variables
+    if len(path_elements) == 0:
+        error_text = f"{name}'s path did not specify variables, but returned variables anyway."
+        raise ValidationError(error_text)
+    if not (isinstance(entry, tuple) and len(entry) == 2):
+        raise ValidationError(f"{name}: Page gave something other than a (params, content) pair.")
+    return _validate_keys([entry[0]], path_elements, name)
@@ -17,7 +17,7 @@ DESCRIPTION = 'Static Site Generator, like flask'
 URL = 'https://github.com/tfpk/dewar'
 EMAIL = 'tomkunc0@gmail.com'
 AUTHOR = 'tfpk'
-REQUIRES_PYTHON = '>=3.6.0'
+REQUIRES_PYTHON = '>=3.8.0'
 VERSION = '1.2.1'
 
 # What packages are required for this module to be executed?
@@ -34,7 +34,10 @@ EXTRAS = {
     ],
     'docs': [
         'sphinx',
-    ]
+    ],
+    'brotli': [
+        'brotli',
+    ],
 }
 
 # The rest you shouldn't have to touch too much :)
@@ -112,9 +115,9 @@ setup(
     # If your package is a single module, use this instead of 'packages':
     # py_modules=['mypackage'],
 
-    # entry_points={
-    #     'console_scripts': ['mycli=mymodule:cli'],
-    # },
+    entry_points={
+        'console_scripts': ['dewar=dewar.cli:main'],
+    },
     install_requires=REQUIRED,
     extras_require=EXTRAS,
     include_package_data=True,
@@ -125,7 +128,7 @@ setup(
         'License :: OSI Approved :: Apache Software License',
         'Programming Language :: Python',
         'Programming Language :: Python :: 3',
-        'Programming Language :: Python :: 3.6',
+        'Programming Language :: Python :: 3.8',
         'Programming Language :: Python :: Implementation :: CPython',
         'Programming Language :: Python :: Implementation :: PyPy'
     ],
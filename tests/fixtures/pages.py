@@ -0,0 +1,20 @@
+"""Page functions defined at module level, so they can be pickled and
+rendered in a process pool."""
+from dewar import dewar
+
+site = dewar.Site(create_backups=False)
+
+
+@site.register('index.html')
+def index():
+    return "index"
+
+
+@site.register('pages/<page>.html')
+def pages():
+    return {str(i): f"page {i}" for i in range(20)}
+
+
+@site.register('mapped/<page>.html')
+def mapped():
+    return map(lambda i: (str(i), f"mapped {i}"), range(5))
@@ -0,0 +1,76 @@
+import json
+import pytest
+
+from dewar.benchmark import BENCHMARKS
+from dewar.cli import load_site, main
+
+SITE_PY = """
+import dewar
+
+site = dewar.Site(bytecode_cache=True)
+
+@site.register('index.html')
+def index():
+    return "index"
+
+if __name__ == "__main__":
+    raise RuntimeError("site.py should not run as __main__")
+"""
+
+
+@pytest.fixture
+def site_file(tmp_path):
+    (tmp_path / 'templates' / 'inner').mkdir(parents=True)
+    (tmp_path / 'templates' / 'base.html').write_text("{% block a %}{% endblock %}")
+    (tmp_path / 'templates' / 'inner' / 'page.html').write_text(
+        "{% extends 'base.html' %}{% block a %}{{ x }}{% endblock %}"
+    )
+    site_file = tmp_path / 'site.py'
+    site_file.write_text(SITE_PY)
+    return site_file
+
+
+def test_load_site(site_file):
+    site = load_site(site_file)
+    assert(site.path == site_file.parent)
+    assert(site.registered_functions.get('index'))
+
+
+def test_load_site_error(tmp_path):
+    (tmp_path / 'empty.py').write_text("")
+    with pytest.raises(SystemExit):
+        main(['--site', str(tmp_path / 'empty.py'), 'compile-templates'])
+
+
+def test_compile_templates(site_file, capsys):
+    main(['--site', str(site_file), 'compile-templates'])
+    assert("Compiled 2 templates" in capsys.readouterr().out)
+    assert(len(list((site_file.parent / '.dewar-cache' / 'jinja').iterdir())) == 2)
+
+
+def test_clear_cache(site_file):
+    cache_path = site_file.parent / '.dewar-cache'
+    (cache_path / 'freeze_func' / 'a').mkdir(parents=True)
+    (cache_path / 'markdown').mkdir(parents=True)
+
+    main(['--site', str(site_file), 'clear-cache', 'freeze_func'])
+    assert(not (cache_path / 'freeze_func').exists())
+    assert((cache_path / 'markdown').exists())
+
+    main(['--site', str(site_file), 'clear-cache'])
+    assert(not (cache_path / 'markdown').exists())
+
+
+def test_benchmark(tmp_path, capsys):
+    output = tmp_path / 'results.json'
+    main(['benchmark', '--repeat', '1', '--output', str(output)])
+    results = json.loads(output.read_text())
+    assert(set(results['benchmarks']) == set(BENCHMARKS))
+    assert(all(result['min'] > 0 for result in results['benchmarks'].values()))
+    assert("render" in capsys.readouterr().out)
+
+    results['benchmarks']['fill_path']['min'] = 1e-12
+    output.write_text(json.dumps(results))
+    with pytest.raises(SystemExit):
+        main(['benchmark', 'fill_path', '--repeat', '1', '--compare', str(output)])
+    assert("fill_path" in capsys.readouterr().out)
@@ -0,0 +1,76 @@
+import gzip
+import os
+import pytest
+import time
+
+from dewar.compression import Compression, check_formats, compress, compress_file
+
+
+def test_check_formats():
+    check_formats(('gzip',))
+    with pytest.raises(ValueError, match='must be one of'):
+        check_formats(('zip',))
+
+
+def test_compress_gzip_is_reproducible():
+    data = b'<p>hello</p>' * 100
+    assert(gzip.decompress(compress(data, 'gzip')) == data)
+    assert(compress(data, 'gzip') == compress(data, 'gzip'))
+
+
+def test_compress_brotli():
+    brotli = pytest.importorskip('brotli')
+    data = b'<p>hello</p>' * 100
+    assert(brotli.decompress(compress(data, 'br')) == data)
+
+
+def test_compression_thresholds(tmp_path):
+    compression = Compression(('gzip',), 100)
+    small = tmp_path / 'small.html'
+    small.write_bytes(b'x')
+    image = tmp_path / 'image.png'
+    image.write_bytes(b'x' * 1000)
+    (tmp_path / 'image.png.gz').write_bytes(b'stale')
+
+    compress_file(small, compression)
+    compress_file(image, compression)
+    assert(not (tmp_path / 'small.html.gz').exists())
+    assert(not (tmp_path / 'image.png.gz').exists())
+
+
+def test_compress_file_only_when_changed(tmp_path):
+    compression = Compression(('gzip',), 10)
+    page = tmp_path / 'page.html'
+    page.write_text('a' * 100)
+    compress_file(page, compression)
+    sibling = tmp_path / 'page.html.gz'
+    assert(gzip.decompress(sibling.read_bytes()) == b'a' * 100)
+
+    mtime = sibling.stat().st_mtime_ns
+    compress_file(page, compression)
+    assert(sibling.stat().st_mtime_ns == mtime)
+
+    page.write_text('b' * 100)
+    os.utime(page, ns=(0, time.time_ns() + 10**9))
+    compress_file(page, compression)
+    assert(gzip.decompress(sibling.read_bytes()) == b'b' * 100)
+
+    # a file replaced by one with an older time, as by `cp -p` or a
+    # restore from a backup, is compressed again too.
+    page.write_text('c' * 100)
+    os.utime(page, ns=(0, 10**9))
+    compress_file(page, compression)
+    assert(gzip.decompress(sibling.read_bytes()) == b'c' * 100)
+
+
+def test_compressed_stream(tmp_path):
+    compression = Compression(('gzip',), 10)
+    page = tmp_path / 'page.html'
+    stream = compression.stream(page)
+    for chunk in (b'abc', b'def' * 10):
+        stream.update(chunk)
+    page.write_bytes(b'abc' + b'def' * 10)
+    stream.commit()
+    assert(gzip.decompress((tmp_path / 'page.html.gz').read_bytes()) == b'abc' + b'def' * 10)
+    assert(sorted(tmp_path.iterdir()) == [page, tmp_path / 'page.html.gz'])
+    assert(compression.is_current(page))
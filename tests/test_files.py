@@ -0,0 +1,63 @@
+import os
+import pytest
+import time
+
+from dewar.files import sync_tree
+
+
+@pytest.fixture
+def static_tree(tmp_path):
+    src = tmp_path / 'src'
+    (src / 'css').mkdir(parents=True)
+    (src / 'css' / 'site.css').write_text('body {}')
+    (src / 'logo.svg').write_text('<svg/>')
+    return src
+
+
+@pytest.mark.parametrize("method", ['copy', 'reflink', 'hardlink'])
+def test_sync_tree(tmp_path, static_tree, method):
+    dst = tmp_path / 'dst'
+    assert(sync_tree(static_tree, dst, method) == {'css/site.css', 'logo.svg'})
+    assert((dst / 'css' / 'site.css').read_text() == 'body {}')
+
+    (static_tree / 'css' / 'site.css').unlink()
+    (static_tree / 'css' / 'site.css').write_text('body { margin: 0 }')
+    (static_tree / 'logo.svg').unlink()
+    (dst / 'stale.txt').write_text('stale')
+    os.utime(static_tree / 'css' / 'site.css', ns=(0, time.time_ns() + 10**9))
+
+    assert(sync_tree(static_tree, dst, method) == {'css/site.css'})
+    assert((dst / 'css' / 'site.css').read_text() == 'body { margin: 0 }')
+    assert(not (dst / 'logo.svg').exists())
+    assert(not (dst / 'stale.txt').exists())
+
+
+def test_sync_tree_skips_unchanged(tmp_path, static_tree):
+    dst = tmp_path / 'dst'
+    sync_tree(static_tree, dst)
+    inode = (dst / 'logo.svg').stat().st_ino
+    sync_tree(static_tree, dst)
+    assert((dst / 'logo.svg').stat().st_ino == inode)
+
+
+def test_sync_tree_hardlink(tmp_path, static_tree):
+    sync_tree(static_tree, tmp_path / 'dst', 'hardlink')
+    assert((tmp_path / 'dst' / 'logo.svg').samefile(static_tree / 'logo.svg'))
+
+
+def test_sync_tree_no_delete(tmp_path, static_tree):
+    (tmp_path / 'dst').mkdir()
+    (tmp_path / 'dst' / 'index.html').write_text('page')
+    sync_tree(static_tree, tmp_path / 'dst', delete=False)
+    assert((tmp_path / 'dst' / 'index.html').exists())
+
+
+def test_sync_tree_follows_symlinks(tmp_path, static_tree):
+    (tmp_path / 'vendor').mkdir()
+    (tmp_path / 'vendor' / 'a.css').write_text('a {}')
+    (static_tree / 'vendor').symlink_to(tmp_path / 'vendor', target_is_directory=True)
+
+    dst = tmp_path / 'dst'
+    assert('vendor/a.css' in sync_tree(static_tree, dst))
+    assert((dst / 'vendor' / 'a.css').read_text() == 'a {}')
+    assert(not (dst / 'vendor').is_symlink())
@@ -88,6 +88,68 @@ def test_load_data_dir(full_site):
     }
 
 
+def test_load_data_modes(full_site):
+    assert(load_data('test_data', mode='bytes') == b'test\n')
+    with load_data('test_data', mode='mmap') as mapped:
+        assert(mapped[:4] == b'test')
+    with pytest.raises(ValueError, match='Data mode'):
+        load_data('test_data', mode='lines')
+    with pytest.raises(ValueError, match='not a file'):
+        load_data('data_dir')
+
+
+def test_load_data_cache(tmp_path):
+    from dewar.data import DataCache
+
+    cache = DataCache(max_size=10)
+    data_file = tmp_path / 'a'
+    data_file.write_text('aaaa')
+    assert(cache.read(data_file) == 'aaaa')
+    assert(cache.read(data_file) is cache.read(data_file))
+
+    data_file.write_text('bbbbb')
+    assert(cache.read(data_file) == 'bbbbb')
+    assert(cache.size == 5)
+
+    (tmp_path / 'b').write_text('c' * 8)
+    cache.read(tmp_path / 'b')
+    # reading b took the cache over its size, so a was forgotten
+    assert(cache.size == 8)
+
+
+def test_load_data_cache_newlines(tmp_path):
+    from dewar.data import DataCache
+
+    data_file = tmp_path / 'a'
+    data_file.write_bytes(b'a\r\nb\rc\n')
+    assert(DataCache().read(data_file) == data_file.read_text() == 'a\nb\nc\n')
+    assert(DataCache().read(data_file, 'bytes') == b'a\r\nb\rc\n')
+
+
+def test_load_data_dir_lazy(tmp_path):
+    from dewar.data import DataDir
+
+    site = Site(path=tmp_path)
+    (tmp_path / 'data' / 'posts' / 'sub').mkdir(parents=True)
+    for name in ('a', 'b', 'c'):
+        (tmp_path / 'data' / 'posts' / name).write_text(name)
+
+    @site.register('index.html')
+    def index():
+        posts = load_data_dir('posts', lazy=True)
+        assert(isinstance(posts, DataDir))
+        assert(list(posts) == ['a', 'b', 'c'])
+        assert('sub' not in posts)
+        return posts['b']
+
+    assert(index() == 'b')
+    data = tmp_path / 'data' / 'posts'
+    assert(site.dependencies.dependencies('index', kinds=('data',)) == {
+        ('data', str(data)), ('data', str(data / 'b'))
+    })
+    site.close()
+
+
 def test_load_json():
     assert(load_json('{"a": ["b", "c"]}') == {'a': ['b', 'c']})
 
@@ -190,3 +252,164 @@ def test_static_url(full_site):
         return ''
 
     path()
+
+
+def test_static_url_fingerprint(tmp_path, full_site):
+    full_site.fingerprint_static = True
+    # keep the static digests out of the fixture's directory.
+    full_site.cache_path = tmp_path
+
+    @full_site.register('path.html')
+    def path():
+        url = static_url('static_file')
+        assert(url == 'static/' + full_site.static_manifest['static_file'])
+        assert(url != 'static/static_file')
+        return ''
+
+    path()
+
+
+def test_load_md_reuses_markdown():
+    from dewar.helpers import _get_markdown
+    assert(_get_markdown() is _get_markdown())
+    # reset between documents, so no state leaks from one to the next
+    assert(load_md("[a]: http://a.com\n\n[a]") == '<p><a href="http://a.com">a</a></p>')
+    assert(load_md("[a]") == '<p>[a]</p>')
+
+
+def test_load_md_cache(tmp_path):
+    site = Site(path=tmp_path, markdown_cache=True)
+    assert(load_md("# Title") == "<h1>Title</h1>")
+    cached = list((tmp_path / '.dewar-cache' / 'markdown').rglob('*'))
+    cache_files = [p for p in cached if p.is_file()]
+    assert(len(cache_files) == 1)
+
+    # a cached document is not rendered again
+    import pickle
+    cache_files[0].write_bytes(pickle.dumps("<h1>Cached</h1>"))
+    assert(load_md("# Title") == "<h1>Cached</h1>")
+    site.markdown_cache.clear()
+    assert(load_md("# Title") == "<h1>Title</h1>")
+
+
+def test_split_pymd():
+    document = split_pymd("# Title\n~~~\na = 1\nb = 2\n~~~\ntext")
+    assert(document.code == "a = 1\nb = 2\n")
+    assert(document.markdown == "# Title\ntext\n")
+    assert(document.code_line == 3)
+    assert(document.has_code)
+    assert(not split_pymd("# Title").has_code)
+
+
+def test_load_pymd_error_line():
+    import traceback
+    from dewar.helpers import _compile_pymd
+
+    TEST_STRING = "# Title\n\n~~~\na = 1\nb = undefined\n~~~\n"
+    with pytest.raises(NameError) as error:
+        load_pymd(TEST_STRING, filename='post.pymd')
+    frame = traceback.extract_tb(error.value.__traceback__)[-1]
+    assert((frame.filename, frame.lineno) == ('post.pymd', 5))
+
+    hits = _compile_pymd.cache_info().hits
+    assert(load_pymd(TEST_STRING.replace('undefined', '2'))[0] == {'a': 1, 'b': 2})
+    assert(load_pymd(TEST_STRING.replace('undefined', '2'))[0] == {'a': 1, 'b': 2})
+    assert(_compile_pymd.cache_info().hits == hits + 1)
+
+
+def test_freeze_func_maxsize():
+    calls = []
+
+    @freeze_func(maxsize=2)
+    def test(x):
+        calls.append(x)
+        return x
+
+    for x in [1, 2, 1, 3, 1, 2]:
+        test(x)
+    # 2 was least recently used when 3 was added
+    assert(calls == [1, 2, 3, 2])
+    assert(test.cache_info() == CacheInfo(hits=2, misses=4, maxsize=2, currsize=2))
+
+    test.cache_clear()
+    assert(test.cache_info() == CacheInfo(hits=0, misses=0, maxsize=2, currsize=0))
+    test(1)
+    assert(calls == [1, 2, 3, 2, 1])
+
+
+def test_freeze_func_ttl():
+    @freeze_func(ttl=0.01)
+    def test():
+        return f"function called at: {time.time()}"
+
+    first_call = test()
+    assert(test() == first_call)
+    time.sleep(0.02)
+    assert(test() != first_call)
+
+
+def test_freeze_func_threads():
+    from concurrent.futures import ThreadPoolExecutor
+
+    @freeze_func
+    def test(x):
+        time.sleep(0.001)
+        return object()
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        results = list(pool.map(test, [1] * 16))
+    assert(all(result is results[0] for result in results))
+
+
+def test_freeze_func_persist(tmp_path):
+    calls = []
+
+    def make_func(version):
+        # a new function each time, as if in a new build
+        @freeze_func(persist=tmp_path, version=version)
+        def test(x):
+            calls.append(x)
+            return [x]
+        return test
+
+    assert(make_func(1)('a') == ['a'])
+    assert(make_func(1)('a') == ['a'])
+    assert(make_func(1)(x='a') == ['a'])
+    assert(calls == ['a', 'a'])
+    assert(make_func(2)('a') == ['a'])
+    assert(calls == ['a', 'a', 'a'])
+
+    test = make_func(1)
+    test.cache_clear(persistent=True)
+    test('a')
+    assert(calls == ['a', 'a', 'a', 'a'])
+
+    # unpicklable arguments are only kept in memory
+    make_func(1)(lambda: None)
+
+
+def test_freeze_func_persist_site(tmp_path):
+    site = Site(path=tmp_path, cache_max_size=10**6)
+
+    @freeze_func(persist=True)
+    def test():
+        return "value"
+
+    test()
+    cache = site.get_cache(f'freeze_func/{test.__module__}.{test.__qualname__}')
+    assert(cache.size() > 0)
+    assert(cache.max_size == 10**6)
+    site.clear_cache('freeze_func')
+    assert(cache.size() == 0)
+
+
+def test_disk_cache_max_size(tmp_path):
+    from dewar.cache import DiskCache
+
+    cache = DiskCache(tmp_path, max_size=2000)
+    for i in range(10):
+        cache.set(str(i), 'x' * 400)
+        time.sleep(0.01)
+    assert(cache.size() <= 2000)
+    assert(cache.get('9') == 'x' * 400)
+    assert(cache.get('0') is None)
@@ -6,6 +6,7 @@ from fixtures.site import site
 from pathlib import Path
 
 import pytest
+import time
 
 
 def test_caller_loc():
@@ -51,3 +52,48 @@ def test_closest_site_multi():
     @site_a.register('tests')
     def test():
         assert(site == site_a)
+
+
+def test_closest_path_in_page(site):
+    @site.register('first/<var>')
+    def first():
+        return {'a': get_closest_path()}
+
+    @site.register('second')
+    def second():
+        first()
+        return get_closest_path()
+
+    assert(second() == 'second')
+    assert(first() == {'a': 'first/<var>'})
+
+
+def test_closest_path_concurrent():
+    import asyncio
+    from concurrent.futures import ThreadPoolExecutor
+
+    site_a = Site()
+    site_b = Site()
+
+    def make_page(site, name):
+        def page():
+            time.sleep(0.01)
+            assert(get_closest_site() is site)
+            return get_closest_path()
+        page.__name__ = name
+        return site.register(name)(page)
+
+    pages = [make_page(site_a, f'a{i}') for i in range(4)]
+    pages += [make_page(site_b, f'b{i}') for i in range(4)]
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        assert(list(pool.map(lambda page: page(), pages)) == [p.path for p in pages])
+
+    async def evaluate(site, name):
+        page = make_page(site, name)
+        await asyncio.sleep(0)
+        return page()
+
+    async def evaluate_all():
+        return await asyncio.gather(evaluate(site_a, 'c'), evaluate(site_b, 'd'))
+
+    assert(asyncio.run(evaluate_all()) == ['c', 'd'])
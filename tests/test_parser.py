@@ -1,6 +1,6 @@
 import pytest
 
-from dewar.parser import parse_path, fill_path
+from dewar.parser import compile_path, parse_path, fill_path
 
 
 @pytest.mark.parametrize("path,out", [
@@ -20,3 +20,37 @@ def test_parse(path, out):
 ])
 def test_parse(path, elems, out):
     assert(fill_path(path, elems) == out)
+
+
+@pytest.mark.parametrize("path,params,out", [
+    ("/{literal}/<var>.html", ["a"], "/{literal}/a.html"),
+    ("/<a>/<b>/<a>/", ["1", "2"], "/1/2/1/"),
+    ("/<a>/<b>/", ["1"], "/1/<b>/"),
+    ("/<a>/", [1], "/1/"),
+])
+def test_route_fill(path, params, out):
+    assert(compile_path(path).fill(params) == out)
+
+
+@pytest.mark.parametrize("path,filled,params", [
+    ("/novar/", "/novar/", ()),
+    ("/<a>/<b>.html", "/1/2.html", ("1", "2")),
+    ("/<a>/<a>.html", "/1/1.html", ("1",)),
+    ("/<a>/<a>.html", "/1/2.html", None),
+    ("/<a>.html", "/1/2.html", None),
+    ("/(<a>).html", "/(x).html", ("x",)),
+])
+def test_route_match(path, filled, params):
+    assert(compile_path(path).match(filled) == params)
+
+
+def test_route_match_nested():
+    route = compile_path("<a>/<b>.html")
+    assert(route.match("2019/hello/world.html") is None)
+    assert(route.match("2019/hello/world.html", nested=True) == ("2019/hello", "world"))
+    assert(compile_path("<a>/<a>.html").match("x/y/x/y.html", nested=True) == ("x/y",))
+
+
+def test_compile_path_cached():
+    assert(compile_path("/<a>/") is compile_path("/<a>/"))
+    assert(compile_path("/<a>/").variables == ("a",))
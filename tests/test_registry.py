@@ -0,0 +1,68 @@
+import pytest
+
+from fixtures.site import site
+
+
+def test_registration_order(site):
+    names = ['c', 'a', 'b']
+    for name in names:
+        def page():
+            return ''
+        page.__name__ = name
+        site.register(f'{name}.html')(page)
+
+    assert([func.name for func in site.registered_functions] == names)
+    assert(site.registered_functions['a'].path == 'a.html')
+    assert(site.registered_functions.get('d') is None)
+    assert(len(site.registered_functions) == 3)
+
+
+def test_duplicate_name(site):
+    @site.register('a.html')
+    def page():
+        return ''
+
+    with pytest.raises(ValueError, match="named 'page' is already registered"):
+        @site.register('b.html')
+        def page():
+            return ''
+
+
+@pytest.mark.parametrize("first,second", [
+    ('a.html', 'a.html'),
+    ('<x>/<y>.html', '<a>/<b>.html'),
+])
+def test_duplicate_path(site, first, second):
+    @site.register(first)
+    def page_one():
+        return ''
+
+    with pytest.raises(ValueError, match="is the same as page_one's"):
+        @site.register(second)
+        def page_two():
+            return ''
+
+
+def test_matches(site):
+    @site.register('index.html')
+    def index():
+        return ''
+
+    @site.register('<category>/<page>.html')
+    def pages():
+        return {}
+
+    @site.register('<name>/<name>/index.html')
+    def repeated():
+        return {}
+
+    registry = site.registered_functions
+    assert(registry.by_path('<a>/<b>.html') is pages)
+    assert(list(registry.matches('index.html')) == [(index, ())])
+    assert(list(registry.matches('blog/post.html')) == [(pages, ('blog', 'post'))])
+    # the last registered first, as it would win in a render
+    assert(list(registry.matches('x/x/index.html')) == [
+        (repeated, ('x',)), (pages, ('x/x', 'index')),
+    ])
+    assert(list(registry.matches('x/y/index.html')) == [(pages, ('x/y', 'index'))])
+    assert(list(registry.matches('missing')) == [])
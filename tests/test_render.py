@@ -1,10 +1,12 @@
+import json
 import os
 import pytest
 import time
 
 from pathlib import Path
 
-from dewar.exceptions import ValidationError
+from dewar.exceptions import RenderError, ValidationError
+from dewar._internal import get_closest_path
 
 from fixtures.site import site, full_site
 
@@ -184,6 +186,26 @@ def test_recursion_error(site, call_self):
         a()
 
 
+def test_recursion_error_across_threads(tmp_path, site):
+    import threading
+
+    # make sure each page is being evaluated before either calls the other
+    both_started = threading.Barrier(2, timeout=5)
+
+    @site.register('a.html')
+    def a():
+        both_started.wait()
+        return b()
+
+    @site.register('b.html')
+    def b():
+        both_started.wait()
+        return a()
+
+    with pytest.raises(RenderError, match="within themselves"):
+        site.render(path=tmp_path, workers=2)
+
+
 def test_static_move(tmp_path, full_site):
     full_site.render(path=tmp_path)
     assert(Path(tmp_path / 'static' / 'static_file').is_file())
@@ -193,3 +215,662 @@ def test_static_move_with_changed_render_path(tmp_path, full_site):
     full_site.static_render_path = ''
     full_site.render(path=tmp_path)
     assert(Path(tmp_path / 'static_file').is_file())
+
+
+@pytest.mark.parametrize("workers", [None, 2])
+def test_render_compressed(tmp_path, workers):
+    import gzip
+    from dewar import Site
+
+    (tmp_path / 'site' / 'static').mkdir(parents=True)
+    (tmp_path / 'site' / 'static' / 'site.css').write_text('body {}' * 100)
+    (tmp_path / 'site' / 'static' / 'logo.png').write_bytes(b'png' * 1000)
+    dist = tmp_path / 'dist'
+
+    def make_site(content):
+        site = Site(path=tmp_path / 'site', create_backups=False, compress=['gzip'],
+                    compress_min_size=100)
+
+        @site.register('<name>.html')
+        def page():
+            return content
+
+        return site
+
+    make_site({'big': 'x' * 1000, 'small': 'x'}).render(path=dist, workers=workers, clean=False)
+    assert(gzip.decompress((dist / 'big.html.gz').read_bytes()) == b'x' * 1000)
+    assert(not (dist / 'small.html.gz').exists())
+    assert((dist / 'static' / 'site.css.gz').is_file())
+    assert(not (dist / 'static' / 'logo.png.gz').exists())
+
+    mtime = (dist / 'static' / 'site.css.gz').stat().st_mtime_ns
+    make_site({'small': 'x'}).render(path=dist, workers=workers, clean=False)
+    assert((dist / 'static' / 'site.css.gz').stat().st_mtime_ns == mtime)
+    assert(not (dist / 'big.html.gz').exists())
+
+    # a static file replaced by one with an older time is compressed again
+    (tmp_path / 'site' / 'static' / 'site.css').write_text('a {}' * 100)
+    os.utime(tmp_path / 'site' / 'static' / 'site.css', ns=(0, 10**9))
+    make_site({'small': 'x'}).render(path=dist, workers=workers, clean=False)
+    assert(gzip.decompress((dist / 'static' / 'site.css.gz').read_bytes()) == b'a {}' * 100)
+
+
+@pytest.mark.parametrize("fingerprint", [False, True])
+def test_static_symlinked_directory(tmp_path, fingerprint):
+    from dewar import Site
+
+    (tmp_path / 'site' / 'static').mkdir(parents=True)
+    (tmp_path / 'vendor').mkdir()
+    (tmp_path / 'vendor' / 'a.css').write_text('a {}')
+    (tmp_path / 'site' / 'static' / 'vendor').symlink_to(tmp_path / 'vendor')
+    site = Site(path=tmp_path / 'site', fingerprint_static=fingerprint)
+
+    site.render(path=tmp_path / 'dist')
+    rendered = site.static_manifest['vendor/a.css']
+    assert((tmp_path / 'dist' / 'static' / rendered).read_text() == 'a {}')
+
+
+def test_compress_single_format():
+    from dewar import Site
+
+    assert(Site(compress='gzip').compression.formats == ('gzip',))
+    with pytest.raises(ValueError, match="not 'zip'"):
+        Site(compress='zip')
+
+
+def test_static_fingerprint(tmp_path):
+    from dewar import Site
+
+    (tmp_path / 'site' / 'static').mkdir(parents=True)
+    static_file = tmp_path / 'site' / 'static' / 'static_file'
+    static_file.write_text('original')
+    site = Site(path=tmp_path / 'site', fingerprint_static=True)
+    dist = tmp_path / 'dist'
+
+    site.render(path=dist)
+    rendered = site.static_manifest['static_file']
+    assert(rendered != 'static_file')
+    assert(rendered.startswith('static_file.'))
+    assert((dist / 'static' / rendered).is_file())
+    assert(not (dist / 'static' / 'static_file').exists())
+    manifest = json.loads((dist / 'static' / 'static-manifest.json').read_text())
+    assert(manifest == site.static_manifest)
+
+    static_file.write_text('changed')
+    site.render(path=dist)
+    assert(site.static_manifest['static_file'] != rendered)
+    assert(not (dist / 'static' / rendered).exists())
+
+
+def test_static_fingerprint_reuses_digests(tmp_path, monkeypatch):
+    from dewar import Site, dewar
+
+    (tmp_path / 'static').mkdir()
+    static_file = tmp_path / 'static' / 'static_file'
+    static_file.write_text('original')
+    Site(path=tmp_path, fingerprint_static=True).render(path=tmp_path / 'dist')
+
+    hashed = []
+    file_digest = dewar.file_digest
+    monkeypatch.setattr(dewar, 'file_digest', lambda path: hashed.append(path) or file_digest(path))
+    # a new site, as in a later build, reads the digests from the cache.
+    site = Site(path=tmp_path, fingerprint_static=True)
+    site.render(path=tmp_path / 'dist')
+    assert(static_file not in hashed)
+
+    static_file.write_text('changed')
+    site.render(path=tmp_path / 'dist')
+    assert(static_file in hashed)
+
+
+@pytest.mark.parametrize("workers", [None, 2])
+def test_render_profile(tmp_path, full_site, workers):
+    from dewar.helpers import load_md_data, render_template
+
+    full_site.create_backups = False
+    hooked = []
+    full_site.profile_hook(hooked.append)
+
+    @full_site.register('template.html')
+    def template():
+        return render_template('template.html', string='a')
+
+    @full_site.register('md/<name>.html')
+    def md():
+        return {'a': load_md_data('test_md'), 'b': 'b'}
+
+    @full_site.register('slow.html')
+    def slow():
+        time.sleep(0.05)
+        return 'slow'
+
+    profile = full_site.render(path=tmp_path, workers=workers)
+    assert(set(profile.pages) == {'template', 'md', 'slow'})
+    assert(profile.slowest(1)[0].name == 'slow')
+    assert(profile.pages['slow'].time >= 0.05)
+    assert(profile.pages['template'].template_time > 0)
+    assert(profile.pages['template'].data_time == 0)
+    assert(profile.pages['md'].data_time > 0)
+    assert(profile.pages['md'].files == 2)
+    assert(profile.pages['md'].bytes == sum(
+        p.stat().st_size for p in (tmp_path / 'md').iterdir()
+    ))
+    assert(profile.time >= profile.pages['slow'].time)
+    assert(sorted(page.name for page in hooked) == ['md', 'slow', 'template'])
+    assert(json.loads(profile.to_json())['pages']['md']['files'] == 2)
+    assert(str(profile).splitlines()[1].startswith('slow'))
+
+
+def test_render_without_profile(tmp_path, site):
+    site.create_backups = False
+
+    @site.register('a.html')
+    def a():
+        return 'a'
+
+    assert(site.render(path=tmp_path) is None)
+
+
+@pytest.mark.parametrize("workers", [1, 4])
+def test_parallel_render(tmp_path, site, workers):
+    PAGE_TEXT = {str(i): f"page {i}" for i in range(50)}
+
+    @site.register("index.html")
+    def index():
+        return ', '.join(sorted(multi_index()))
+
+    @site.register("pages/<page>.html")
+    def multi_index():
+        return PAGE_TEXT
+
+    site.render(path=tmp_path, workers=workers)
+
+    for key in PAGE_TEXT:
+        with open(tmp_path / f"pages/{key}.html", 'r') as page:
+            assert(page.read() == PAGE_TEXT[key])
+    with open(tmp_path / "index.html", 'r') as page:
+        assert(page.read() == ', '.join(sorted(PAGE_TEXT)))
+
+
+@pytest.mark.parametrize("streams", [False, True])
+def test_parallel_render_same_file(tmp_path, site, streams):
+    @site.register("a/b.html")
+    def fixed():
+        return "fixed"
+
+    @site.register("a/<x>.html")
+    def dynamic():
+        if streams:
+            return iter([("b", "dyn")])
+        return {"b": "dyn"}
+
+    @site.register("<x>/c.html")
+    def first():
+        yield "a", "first"
+
+    @site.register("a/c.html")
+    def last():
+        return "last"
+
+    for _ in range(20):
+        site.render(path=tmp_path, workers=4)
+        assert((tmp_path / "a" / "b.html").read_text() == "dyn")
+        assert((tmp_path / "a" / "c.html").read_text() == "last")
+
+
+def test_parallel_render_process_pool(tmp_path):
+    from concurrent.futures import ProcessPoolExecutor
+    from fixtures import pages
+
+    with ProcessPoolExecutor(max_workers=2) as pool:
+        pages.site.render(path=tmp_path, executor=pool)
+
+    assert((tmp_path / "index.html").read_text() == "index")
+    assert((tmp_path / "pages/7.html").read_text() == "page 7")
+    assert((tmp_path / "mapped/3.html").read_text() == "mapped 3")
+    # the parent process memoises what the pool returned
+    assert(pages.site._evaluation.get(pages.pages).returned['7'] == "page 7")
+
+
+@pytest.mark.parametrize("workers", [None, 2])
+def test_render_error_names_page(tmp_path, site, workers):
+    @site.register("broken.html")
+    def broken():
+        raise KeyError("missing")
+
+    with pytest.raises(RenderError, match="broken: KeyError"):
+        site.render(path=tmp_path, workers=workers)
+
+
+def test_incremental_render(tmp_path):
+    from dewar import Site
+    from dewar.helpers import load_data
+
+    (tmp_path / 'site' / 'data').mkdir(parents=True)
+    (tmp_path / 'site' / 'data' / 'a').write_text('a')
+    (tmp_path / 'site' / 'data' / 'b').write_text('b')
+    dist = tmp_path / 'dist'
+    calls = []
+
+    def make_site(pages):
+        site = Site(path=tmp_path / 'site', create_backups=False)
+        for name in pages:
+            def page(name=name):
+                calls.append(name)
+                return load_data(name)
+            page.__name__ = name
+            site.register(f'{name}.html')(page)
+        return site
+
+    make_site('ab').render(path=dist, incremental=True)
+    assert(sorted(calls) == ['a', 'b'])
+    assert((tmp_path / 'dist.manifest.json').is_file())
+
+    calls.clear()
+    (tmp_path / 'site' / 'data' / 'b').write_text('changed')
+    make_site('ab').render(path=dist, incremental=True)
+    assert(calls == ['b'])
+    assert((dist / 'b.html').read_text() == 'changed')
+
+    calls.clear()
+    make_site('a').render(path=dist, incremental=True)
+    assert(calls == [])
+    assert((dist / 'a.html').is_file())
+    assert(not (dist / 'b.html').exists())
+
+
+def test_incremental_render_page_dependency(tmp_path):
+    from dewar import Site
+    from dewar.helpers import load_data
+
+    (tmp_path / 'site' / 'data').mkdir(parents=True)
+    (tmp_path / 'site' / 'data' / 'title').write_text('one')
+    dist = tmp_path / 'dist'
+
+    def make_site():
+        site = Site(path=tmp_path / 'site', create_backups=False)
+
+        @site.register('title.html')
+        def title():
+            return load_data('title')
+
+        @site.register('index.html')
+        def index():
+            return f"<h1>{title()}</h1>"
+        return site
+
+    make_site().render(path=dist, incremental=True)
+    (tmp_path / 'site' / 'data' / 'title').write_text('two')
+    make_site().render(path=dist, incremental=True)
+    assert((dist / 'index.html').read_text() == '<h1>two</h1>')
+
+
+def test_render_only_changed(tmp_path, site):
+    PAGE_TEXT = {"a": "page a", "b": "page b"}
+
+    @site.register("<page>.html")
+    def pages():
+        return dict(PAGE_TEXT)
+
+    site.render(path=tmp_path / 'dist', clean=False)
+    (tmp_path / 'dist' / 'extra.html').write_text('not part of the site')
+    unchanged = (tmp_path / 'dist' / 'a.html').stat().st_mtime_ns
+    changed = (tmp_path / 'dist' / 'b.html').stat().st_ino
+
+    PAGE_TEXT["b"] = "new page b"
+    site.render(path=tmp_path / 'dist', clean=False)
+
+    assert((tmp_path / 'dist' / 'a.html').stat().st_mtime_ns == unchanged)
+    assert((tmp_path / 'dist' / 'b.html').stat().st_ino != changed)
+    assert((tmp_path / 'dist' / 'b.html').read_text() == "new page b")
+    assert(not (tmp_path / 'dist' / 'extra.html').exists())
+
+
+@pytest.mark.parametrize("workers", [None, 4])
+def test_streaming_render(tmp_path, site, workers):
+    @site.register("<page>.html")
+    def pages():
+        for i in range(200):
+            if workers is None and i:
+                # the previous entry was written before this one is made
+                assert((tmp_path / f"{i - 1}.html").is_file())
+            assert(get_closest_path() == "<page>.html")
+            yield str(i), f"page {i}"
+
+    site.render(path=tmp_path, workers=workers)
+
+    for i in range(200):
+        assert((tmp_path / f"{i}.html").read_text() == f"page {i}")
+
+
+@pytest.mark.parametrize("workers", [None, 2])
+def test_iterator_render(tmp_path, site, workers):
+    from dewar.dewar import MAX_PENDING_WRITES
+
+    calls = []
+    lag = 0 if workers is None else MAX_PENDING_WRITES + 1
+
+    def entry(i):
+        if i > lag:
+            # entries are written as they are made, not all at the end
+            assert((tmp_path / f"{i - lag - 1}.html").is_file())
+        return str(i), f"page {i}"
+
+    @site.register("<page>.html")
+    def pages():
+        calls.append("pages")
+        return (entry(i) for i in range(200))
+
+    site.render(path=tmp_path, workers=workers)
+    assert((tmp_path / "199.html").read_text() == "page 199")
+    assert(calls == ["pages"])
+
+
+@pytest.mark.parametrize("workers", [None, 2])
+def test_pairs_render(tmp_path, site, workers):
+    @site.register("<page>.html")
+    def pages():
+        return [("a", "page a"), (("b",), "page b")]
+
+    site.render(path=tmp_path, workers=workers)
+    assert((tmp_path / "a.html").read_text() == "page a")
+    assert((tmp_path / "b.html").read_text() == "page b")
+    assert(site.render_path("b.html") == "page b")
+
+
+def test_streaming_validation(tmp_path, site):
+    @site.register("<a>/<b>.html")
+    def pages():
+        yield ("a", "b"), "fine"
+        yield "a", "not enough variables"
+
+    entries = pages()
+    assert(next(entries) == (("a", "b"), "fine"))
+    with pytest.raises(ValidationError, match="multiple variables"):
+        next(entries)
+
+    with pytest.raises(RenderError, match="pages: ValidationError"):
+        site.render(path=tmp_path)
+
+
+@pytest.mark.parametrize("workers", [None, 2])
+def test_stream_template_render(tmp_path, workers):
+    import pickle
+    from dewar import Site
+    from dewar.helpers import stream_template
+
+    (tmp_path / 'site' / 'templates').mkdir(parents=True)
+    (tmp_path / 'site' / 'templates' / 'rows.html').write_text(
+        "{% for i in rows %}<a href=\"{{ url_for('table') }}\">{{ i }}</a>\n{% endfor %}"
+    )
+    site = Site(path=tmp_path / 'site', create_backups=False)
+
+    @site.register('tables/table.html')
+    def table():
+        return stream_template('rows.html', rows=range(1000))
+
+    site.render(path=tmp_path / 'dist', workers=workers)
+
+    expected = ''.join(f'<a href="table.html">{i}</a>\n' for i in range(1000))
+    assert((tmp_path / 'dist' / 'tables' / 'table.html').read_text() == expected)
+    # a streamed template can be rendered again, or sent to another process
+    assert(str(table()) == expected)
+    assert(pickle.loads(pickle.dumps(table())) == expected)
+
+
+def test_atomic_render(tmp_path, site):
+    dist = tmp_path / 'dist'
+    version = ["one"]
+
+    @site.register("index.html")
+    def index():
+        return version[0]
+
+    def render(**kwargs):
+        site.render(path=dist, atomic=True, generations=1, **kwargs)
+
+    render()
+    assert(dist.is_symlink())
+    assert((dist / 'index.html').read_text() == "one")
+
+    version[0] = "two"
+    render(clean=False)
+    assert((dist / 'index.html').read_text() == "two")
+
+    version[0] = "three"
+    render()
+    assert((dist / 'index.html').read_text() == "three")
+    # only the current and one previous generation are kept
+    assert(len(list((tmp_path / 'dist.generations').iterdir())) == 2)
+
+    site.rollback(path=dist)
+    assert((dist / 'index.html').read_text() == "two")
+    with pytest.raises(RuntimeError, match="older generations"):
+        site.rollback(path=dist)
+
+    # returning None fails validation
+    version[0] = None
+    with pytest.raises(RenderError):
+        render()
+    assert((dist / 'index.html').read_text() == "two")
+    assert(len(list((tmp_path / 'dist.generations').iterdir())) == 2)
+
+
+def test_atomic_render_replaces_directory(tmp_path, site):
+    @site.register("index.html")
+    def index():
+        return "new"
+
+    (tmp_path / 'dist').mkdir()
+    (tmp_path / 'dist' / 'index.html').write_text("old")
+    site.render(path=tmp_path / 'dist', atomic=True)
+    assert((tmp_path / 'dist' / 'index.html').read_text() == "new")
+    site.rollback(path=tmp_path / 'dist')
+    assert((tmp_path / 'dist' / 'index.html').read_text() == "old")
+
+
+@pytest.mark.parametrize("clean", [True, False])
+def test_render_after_atomic_render(tmp_path, site, clean):
+    dist = tmp_path / 'dist'
+    version = ["one"]
+
+    @site.register("index.html")
+    def index():
+        return version[0]
+
+    @site.register("other.html")
+    def other():
+        return "other"
+
+    site.render(path=dist, atomic=True)
+    generation = dist.resolve()
+    version[0] = "two"
+    site.render(path=dist, clean=clean)
+    assert(not dist.is_symlink())
+    assert((dist / 'index.html').read_text() == "two")
+    assert((dist / 'other.html').read_text() == "other")
+    # the generation it pointed to is left as it was
+    assert((generation / 'index.html').read_text() == "one")
+
+
+@pytest.mark.parametrize("method", ['zip', 'hardlink'])
+def test_backups(tmp_path, method):
+    from dewar import Site
+    from dewar.backups import list_backups
+
+    site = Site(path=tmp_path, backup_method=method, keep_backups=2)
+    version = [0]
+
+    @site.register("index.html")
+    def index():
+        return f"version {version[0]}"
+
+    dist = tmp_path / 'dist'
+    for i in range(4):
+        version[0] = i
+        site.render(path=dist)
+
+    backups = list_backups(dist)
+    assert(len(backups) == 2)
+    if method == 'hardlink':
+        # backups are unchanged by the renders after them
+        assert((backups[0] / 'index.html').read_text() == "version 1")
+        assert((backups[1] / 'index.html').read_text() == "version 2")
+    else:
+        assert(all(b.suffix == '.zip' for b in backups))
+
+
+def test_backups_max_size(tmp_path):
+    from dewar.backups import list_backups, make_backup, prune_backups
+
+    dist = tmp_path / 'dist'
+    dist.mkdir()
+    (dist / 'big').write_bytes(b'x' * 1000)
+    for i in range(3):
+        make_backup(dist, 'hardlink')
+    # hardlinked backups of the same file only count once
+    prune_backups(dist, max_size=1500)
+    assert(len(list_backups(dist)) == 3)
+
+    for i in range(3):
+        (dist / 'big').unlink()
+        (dist / 'big').write_bytes(b'x' * 1000)
+        make_backup(dist, 'hardlink')
+    prune_backups(dist, max_size=1500)
+    assert(len(list_backups(dist)) == 1)
+
+
+def test_backup_method_error():
+    from dewar import Site
+    with pytest.raises(ValueError, match="Backup method"):
+        Site(backup_method='tar')
+
+
+def test_render_path(site):
+    calls = []
+
+    @site.register('index.html')
+    def index():
+        calls.append('index')
+        return 'index'
+
+    @site.register('posts/<post>.html')
+    def posts():
+        calls.append('posts')
+        return {'a': 'post a', ('b',): 'post b'}
+
+    @site.register('<year>/<month>.html')
+    def archive():
+        yield ('2020', '01'), 'january'
+        yield ('2020', '02'), 'february'
+
+    assert(site.render_path('index.html') == 'index')
+    assert(site.render_path('/posts/a.html') == 'post a')
+    assert(site.render_path(Path('posts') / 'b.html') == 'post b')
+    assert(site.render_path('2020/02.html') == 'february')
+    assert(site.render_path('posts/c.html') is None)
+    assert(site.render_path('missing/path/x.html') is None)
+    assert(calls == ['index', 'posts'])
+
+    site.render_path('posts/a.html')
+    assert(calls == ['index', 'posts'])
+    site.invalidate(['posts'])
+    site.render_path('posts/a.html')
+    assert(calls == ['index', 'posts', 'posts'])
+    site.invalidate()
+    site.render_path('index.html')
+    assert(calls == ['index', 'posts', 'posts', 'index'])
+
+
+def test_render_path_overlapping_routes(tmp_path, site):
+    @site.register('<section>/index.html')
+    def sections():
+        return {'blog': 'blog index'}
+
+    @site.register('docs/<page>.html')
+    def docs():
+        return {'index': 'docs index', 'intro': 'intro'}
+
+    @site.register('<year>/<post>.html')
+    def posts():
+        return {('2019/05', 'hello'): 'nested post'}
+
+    site.render(path=tmp_path)
+    for path in ('blog/index.html', 'docs/index.html', '2019/05/hello.html'):
+        assert(site.render_path(path) == (tmp_path / path).read_text())
+    assert(site.render_path('docs/missing.html') is None)
+
+
+def test_render_path_error(site):
+    fail = [True]
+
+    @site.register('broken.html')
+    def broken():
+        if fail[0]:
+            raise KeyError('missing')
+        return 'fixed'
+
+    with pytest.raises(RenderError, match="broken: KeyError"):
+        site.render_path('broken.html')
+    fail[0] = False
+    assert(site.render_path('broken.html') == 'fixed')
+
+
+def test_render_again(tmp_path, site):
+    version = ["one"]
+    calls = []
+
+    @site.register("index.html")
+    def index():
+        calls.append("index")
+        return version[0]
+
+    @site.register("other.html")
+    def other():
+        calls.append("other")
+        return "other"
+
+    site.render(path=tmp_path)
+    version[0] = "two"
+    site.render(path=tmp_path)
+    assert((tmp_path / 'index.html').read_text() == "two")
+    assert(calls == ["index", "other"] * 2)
+
+    # without fresh, only invalidated pages are evaluated again
+    version[0] = "three"
+    site.invalidate([index])
+    site.render(path=tmp_path, fresh=False)
+    assert((tmp_path / 'index.html').read_text() == "three")
+    assert(calls == ["index", "other"] * 2 + ["index"])
+
+
+@pytest.mark.parametrize("validate", [False, True])
+def test_invalidate_while_evaluating(tmp_path, site, validate):
+    calls = []
+
+    @site.register("slow.html", validate=validate)
+    def slow():
+        calls.append("slow")
+        # as the dev server does when a file changes during a render
+        site.invalidate()
+        return "slow"
+
+    site.render(path=tmp_path)
+    assert((tmp_path / "slow.html").read_text() == "slow")
+    assert(calls == ["slow"])
+
+
+def test_page_error_is_not_memoised(site):
+    fail = [True]
+
+    @site.register("broken.html")
+    def broken():
+        if fail[0]:
+            raise KeyError("missing")
+        return "fixed"
+
+    for _ in range(2):
+        with pytest.raises(KeyError):
+            broken()
+    fail[0] = False
+    assert(broken() == "fixed")
@@ -0,0 +1,113 @@
+import os
+import pytest
+import threading
+import time
+import urllib.error
+import urllib.request
+
+from dewar import Site
+from dewar.helpers import load_data, render_template
+from dewar.server import EVENTS_PATH, changed_files, make_server, snapshot
+
+
+@pytest.fixture
+def dev_site(tmp_path):
+    (tmp_path / 'templates').mkdir()
+    (tmp_path / 'templates' / 'page.html').write_text("<body>{{ text }}</body>")
+    (tmp_path / 'data').mkdir()
+    (tmp_path / 'data' / 'a').write_text('a')
+    (tmp_path / 'data' / 'b').write_text('b')
+    (tmp_path / 'static').mkdir()
+    (tmp_path / 'static' / 'style.css').write_text('body {}')
+    site = Site(path=tmp_path)
+    calls = []
+
+    @site.register('index.html')
+    def index():
+        calls.append('index')
+        return render_template('page.html', text=load_data('a'))
+
+    @site.register('<name>.html')
+    def named():
+        calls.append('named')
+        return {'b': load_data('b'), 'c': index()}
+
+    site.calls = calls
+    yield site
+    site.close()
+
+
+@pytest.fixture
+def server(dev_site):
+    server = make_server(dev_site, port=0, watch=True, interval=3600)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    server.url = f'http://127.0.0.1:{server.server_address[1]}/'
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def get(url):
+    with urllib.request.urlopen(url) as response:
+        return response.read().decode('utf-8'), response.headers['Content-Type']
+
+
+def test_snapshot(tmp_path):
+    (tmp_path / 'a' / 'b').mkdir(parents=True)
+    (tmp_path / 'a' / 'b' / 'c').write_text('c')
+    before = snapshot([tmp_path / 'a', tmp_path / 'missing'])
+    assert(set(before) == {str(tmp_path / 'a' / 'b' / 'c')})
+
+    (tmp_path / 'a' / 'd').write_text('d')
+    (tmp_path / 'a' / 'b' / 'c').write_text('cc')
+    assert(changed_files(before, snapshot([tmp_path / 'a'])) == {
+        str(tmp_path / 'a' / 'd'), str(tmp_path / 'a' / 'b' / 'c'),
+    })
+
+
+def test_serve_pages(server, dev_site):
+    content, content_type = get(server.url)
+    assert(content.startswith('<body>a<script>'))
+    assert(EVENTS_PATH in content)
+    assert(content_type == 'text/html; charset=utf-8')
+    assert(get(server.url + 'b.html')[0].startswith('b'))
+
+    content, content_type = get(server.url + 'static/style.css')
+    assert((content, content_type) == ('body {}', 'text/css'))
+
+    for missing in ('d.html', 'static/missing.css', 'a/b.html'):
+        with pytest.raises(urllib.error.HTTPError, match='404'):
+            get(server.url + missing)
+    assert(not (dev_site.path / 'dist').exists())
+
+
+def test_serve_error(server, dev_site):
+    @dev_site.register('broken.html')
+    def broken():
+        raise KeyError('missing')
+
+    with pytest.raises(urllib.error.HTTPError, match='500') as error:
+        get(server.url + 'broken.html')
+    assert(b'KeyError' in error.value.read())
+    # the page is tried again, rather than being left half evaluated.
+    with pytest.raises(urllib.error.HTTPError, match='500'):
+        get(server.url + 'broken.html')
+
+
+def test_serve_reload(server, dev_site):
+    get(server.url)
+    get(server.url + 'b.html')
+    # named is registered last, so it is tried first for index.html too
+    assert(dev_site.calls == ['named', 'index'])
+
+    events = urllib.request.urlopen(server.url + EVENTS_PATH[1:])
+    (dev_site.path / 'data' / 'b').write_text('changed')
+    os.utime(dev_site.path / 'data' / 'b', ns=(0, time.time_ns() + 10**9))
+    assert(server.watcher.check() == {str(dev_site.path / 'data' / 'b')})
+    assert(events.readline() == b'event: reload\n')
+    events.close()
+
+    assert(get(server.url + 'b.html')[0].startswith('changed'))
+    assert(get(server.url)[0].startswith('<body>a'))
+    assert(dev_site.calls == ['named', 'index', 'named'])
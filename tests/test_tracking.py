@@ -0,0 +1,82 @@
+import json
+import pytest
+
+from dewar import Site
+from dewar.helpers import load_data, load_data_dir, render_template, static_url
+
+
+@pytest.fixture
+def tracked_site(tmp_path):
+    (tmp_path / 'templates').mkdir()
+    (tmp_path / 'templates' / 'base.html').write_text("<body>{% block a %}{% endblock %}</body>")
+    (tmp_path / 'templates' / 'footer.html').write_text("footer")
+    (tmp_path / 'templates' / 'page.html').write_text(
+        "{% extends 'base.html' %}{% block a %}{{ text }}{% include 'footer.html' %}{% endblock %}"
+    )
+    (tmp_path / 'data' / 'posts').mkdir(parents=True)
+    (tmp_path / 'data' / 'posts' / 'x.md').write_text('x')
+    (tmp_path / 'data' / 'about').write_text('about')
+    (tmp_path / 'static').mkdir()
+    (tmp_path / 'static' / 'style.css').write_text('body {}')
+    site = Site(path=tmp_path, create_backups=False)
+
+    @site.register('about.html')
+    def about():
+        return render_template('page.html', text=load_data('about') + static_url('style.css'))
+
+    @site.register('posts/<post>.html')
+    def posts():
+        return load_data_dir('posts')
+
+    @site.register('index.html')
+    def index():
+        return posts()['x.md'] + about()
+
+    @site.register('unrendered.html')
+    def unrendered():
+        return ''
+
+    yield site
+    site.close()
+
+
+def test_dependency_graph(tracked_site):
+    tracked_site.render_path('index.html')
+    graph = tracked_site.dependencies
+    assert(set(graph) == {'about', 'posts', 'index'})
+    templates = {
+        str(tracked_site.path / 'templates' / name)
+        for name in ('base.html', 'footer.html', 'page.html')
+    }
+    assert({target for _, target in graph.dependencies('about', kinds=('template',))} == templates)
+    assert(('static', str(tracked_site.static_path / 'style.css')) in graph.dependencies('about'))
+    assert(graph.dependencies('index', kinds=('page',)) == {('page', 'posts'), ('page', 'about')})
+    with pytest.raises(KeyError):
+        graph.dependencies('unrendered')
+
+    assert(graph.dependents('data/posts/x.md') == {'posts', 'index'})
+    assert(graph.dependents('data/posts/new.md', transitive=False) == {'posts'})
+    assert(graph.dependents(tracked_site.path / 'templates' / 'footer.html') == {'about', 'index'})
+    assert(graph.dependents(['static/style.css', 'data/missing']) == {'about', 'index'})
+    assert(graph.dependents('data/missing') == set())
+    assert(graph.callers('posts') == {'index'})
+
+
+def test_dependency_graph_export(tracked_site):
+    tracked_site.render_path('about.html')
+    graph = tracked_site.dependencies
+    exported = json.loads(graph.to_json())
+    assert(set(exported) == {'about'})
+    assert(exported['about']['data'] == [str(tracked_site.path / 'data' / 'about')])
+
+    dot = graph.to_dot()
+    assert(dot.startswith('digraph dependencies {'))
+    assert('"about" [shape=box];' in dot)
+    assert('[label="template: templates/base.html"]' in dot)
+
+
+def test_dependency_graph_invalidate(tracked_site):
+    tracked_site.render_path('index.html')
+    tracked_site.invalidate(['about'])
+    assert('about' not in tracked_site.dependencies)
+    assert('index' in tracked_site.dependencies)
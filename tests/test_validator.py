@@ -1,6 +1,6 @@
 import pytest
 
-from dewar.validator import validate_page
+from dewar.validator import validate_entry, validate_page
 from dewar.exceptions import ValidationError
 
 
@@ -35,3 +35,37 @@ def test_validate_page_errors(func, error):
 )
 def test_validation_passes(func):
     assert validate_page(func)
+
+
+def test_validate_given_value():
+    assert validate_page(func_with_path('/index.html', None), "test")
+    with pytest.raises(ValidationError, match="not return a valid object"):
+        validate_page(func_with_path('/index.html', "test"), None)
+
+
+def test_validate_pairs():
+    assert validate_page(func_with_path('/<test>.html', [('a', 'a'), (('b',), 'b')]))
+    assert validate_page(func_with_path('/<test>.html', (('a', 'a'),)))
+    with pytest.raises(ValidationError, match="pair"):
+        validate_page(func_with_path('/<test>.html', ['a']))
+    with pytest.raises(ValidationError, match="did not specify variables"):
+        validate_page(func_with_path('/index.html', [('a', 'a')]))
+
+
+def test_validate_iterator():
+    assert validate_page(func_with_path('/<test>/index.html', iter([])))
+    with pytest.raises(ValidationError, match="did not specify variables"):
+        validate_page(func_with_path('/index.html', iter([])))
+
+
+@pytest.mark.parametrize(
+    "entry,error",
+    [
+        (("a", "b", "c"), "pair"),
+        ((1, "content"), "keys of the right type"),
+        ((("a", "b"), "content"), "incorrect number"),
+    ]
+)
+def test_validate_entry_errors(entry, error):
+    with pytest.raises(ValidationError, match=error):
+        validate_entry(func_with_path('/<test>/index.html', None), entry)